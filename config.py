@@ -5,125 +5,214 @@ Centralized control over all system parameters
 """
 
 import os
+from collections import namedtuple
 from pathlib import Path
+from types import MappingProxyType
+import numpy as np
+
+class _Field:
+    """Config attribute with a class-level default.
+    
+    Instances only store a value (in a private slot) once it is assigned.
+    Assignment validates the value and, for fields that feed a derived
+    value, invalidates the derived caches.
+    """
+    
+    def __init__(self, default, check=None, error=None, cached=False):
+        self.default = default
+        self.check = check
+        self.error = error
+        self.cached = cached
+    
+    def __set_name__(self, owner, name):
+        self.attr = '_' + name
+    
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        try:
+            return getattr(obj, self.attr)
+        except AttributeError:
+            return self.default
+    
+    def __set__(self, obj, value):
+        if self.check is not None and not self.check(value):
+            raise ValueError(self.error)
+        setattr(obj, self.attr, value)
+        if self.cached:
+            obj._invalidate_caches()
+
+# Per-frame detection parameters, read once per frame via config.snapshot()
+_HotParams = namedtuple('_HotParams', 'conf nms iou max_det min_sz enable_roi roi_rel')
+
+def _unit_range(value):
+    return 0.0 <= value <= 1.0
+
+def _positive(value):
+    return value > 0
+
+def _percent(value):
+    return 1 <= value <= 100
 
 class DetectionConfig:
-    """Configuration class for milk detection parameters"""
+    """Configuration class for milk detection parameters
+    
+    Defaults live on the class; an instance only stores the fields that
+    have been changed. Fields marked cached=True feed the ROI, snapshot,
+    to_dict or path caches and drop them when assigned.
+    """
+    
+    # Model Configuration
+    MODEL_PATH = _Field("model/best_float32.tflite", cached=True)
+    MODEL_INPUT_SIZE = _Field((640, 640))  # (width, height)
+    
+    # Detection Thresholds
+    CONFIDENCE_THRESHOLD = _Field(0.5, _unit_range,      # Minimum confidence for detection (0.0 - 1.0)
+                                  "CONFIDENCE_THRESHOLD must be between 0.0 and 1.0", cached=True)
+    NMS_THRESHOLD = _Field(0.4, _unit_range,             # Non-maximum suppression threshold (0.0 - 1.0)
+                           "NMS_THRESHOLD must be between 0.0 and 1.0", cached=True)
+    IOU_THRESHOLD = _Field(0.5, _unit_range,             # Intersection over Union threshold
+                           "IOU_THRESHOLD must be between 0.0 and 1.0", cached=True)
+    
+    # ROI (Region of Interest) Configuration
+    ENABLE_ROI = _Field(True, cached=True)               # Enable/disable ROI filtering
+    ROI_X1 = _Field(0.1, _unit_range,                    # ROI left boundary (0.0 - 1.0, relative to image width)
+                    "ROI_X1 must be between 0.0 and 1.0", cached=True)
+    ROI_Y1 = _Field(0.1, _unit_range,                    # ROI top boundary (0.0 - 1.0, relative to image height)
+                    "ROI_Y1 must be between 0.0 and 1.0", cached=True)
+    ROI_X2 = _Field(0.9, _unit_range,                    # ROI right boundary (0.0 - 1.0, relative to image width)
+                    "ROI_X2 must be between 0.0 and 1.0", cached=True)
+    ROI_Y2 = _Field(0.9, _unit_range,                    # ROI bottom boundary (0.0 - 1.0, relative to image height)
+                    "ROI_Y2 must be between 0.0 and 1.0", cached=True)
+    
+    # Camera Configuration
+    CAMERA_INDEX = _Field(0)                             # Camera device index
+    CAMERA_RESOLUTION = _Field((640, 480), cached=True)  # (width, height)
+    CAMERA_FPS = _Field(30, _positive,                   # Frames per second
+                        "CAMERA_FPS must be positive", cached=True)
+    USE_PICAMERA2 = _Field(True, cached=True)            # Use PiCamera2 instead of OpenCV camera
+    
+    # Processing Configuration
+    ENABLE_PREPROCESSING = _Field(True)                  # Enable image preprocessing
+    ENABLE_POSTPROCESSING = _Field(True)                 # Enable detection post-processing
+    MAX_DETECTIONS = _Field(10, cached=True)             # Maximum number of detections to process
+    MIN_DETECTION_SIZE = _Field(20, cached=True)         # Minimum detection size in pixels
+    
+    # Performance Configuration
+    NUM_THREADS = _Field(4, _positive,                   # Number of threads for TFLite interpreter
+                         "NUM_THREADS must be positive", cached=True)
+    ENABLE_FPS_DISPLAY = _Field(True)                    # Show FPS on output
+    ENABLE_DETECTION_COUNT = _Field(True)                # Show detection count on output
+    FRAME_SKIP = _Field(0)                               # Skip frames for performance (0 = process all)
+    
+    # Output Configuration
+    SAVE_DETECTIONS = _Field(True, cached=True)          # Save detected frames
+    OUTPUT_DIR = _Field("saved_frames", cached=True)     # Directory to save output
+    IMAGE_FORMAT = _Field("jpg")                         # Output image format
+    QUALITY = _Field(95, _percent,                       # JPEG quality (1-100)
+                     "QUALITY must be between 1 and 100")
+    
+    # Visualization Configuration
+    DRAW_BOUNDING_BOXES = _Field(True)                   # Draw detection boxes
+    DRAW_LABELS = _Field(True)                           # Draw confidence labels
+    BOX_COLOR = _Field((0, 255, 0))                      # BGR color for boxes
+    LABEL_COLOR = _Field((0, 0, 0))                      # BGR color for labels
+    LINE_THICKNESS = _Field(2)                           # Thickness of bounding box lines
+    FONT_SCALE = _Field(0.5)                             # Font scale for labels
+    
+    # Alert Configuration
+    ENABLE_ALERTS = _Field(True, cached=True)            # Enable detection alerts
+    ALERT_THRESHOLD = _Field(1, cached=True)             # Minimum detections to trigger alert
+    ALERT_COOLDOWN = _Field(5.0)                         # Seconds between alerts
+    
+    # Logging Configuration
+    ENABLE_LOGGING = _Field(True)                        # Enable logging
+    LOG_LEVEL = _Field("INFO")                           # Log level (DEBUG, INFO, WARNING, ERROR)
+    LOG_FILE = _Field("milk_detection.log")              # Log file path
+    
+    # System Optimization
+    ENABLE_GPU_MEMORY = _Field(True)                     # Enable GPU memory allocation
+    GPU_MEMORY = _Field(128)                             # GPU memory in MB
+    OVERCLOCK_ENABLED = _Field(False)                    # Enable overclocking
+    TEMP_LIMIT = _Field(70)                              # Temperature limit in Celsius
+    
+    # Network Configuration (if using remote monitoring)
+    ENABLE_NETWORK = _Field(False)                       # Enable network features
+    HOST = _Field("0.0.0.0")                             # Host for network server
+    PORT = _Field(8080)                                  # Port for network server
+    
+    # PERFORMANCE OPTIMIZATION: Fixed slots instead of a per-instance dict:
+    # one private slot per field plus the derived caches
+    _FIELD_SLOTS = tuple('_' + name for name, value in list(locals().items())
+                         if isinstance(value, _Field))
+    __slots__ = _FIELD_SLOTS + (
+        '_roi_cache', '_model_path_cached', '_output_dir_cached', '_hot', '_dict_cache',
+    )
     
     def __init__(self):
-        # Model Configuration
-        self.MODEL_PATH = "model/best_float32.tflite"
-        self.MODEL_INPUT_SIZE = (640, 640)  # (width, height)
-        
-        # Detection Thresholds
-        self.CONFIDENCE_THRESHOLD = 0.5      # Minimum confidence for detection (0.0 - 1.0)
-        self.NMS_THRESHOLD = 0.4             # Non-maximum suppression threshold (0.0 - 1.0)
-        self.IOU_THRESHOLD = 0.5             # Intersection over Union threshold
-        
-        # ROI (Region of Interest) Configuration
-        self.ENABLE_ROI = True               # Enable/disable ROI filtering
-        self.ROI_X1 = 0.1                    # ROI left boundary (0.0 - 1.0, relative to image width)
-        self.ROI_Y1 = 0.1                    # ROI top boundary (0.0 - 1.0, relative to image height)
-        self.ROI_X2 = 0.9                    # ROI right boundary (0.0 - 1.0, relative to image width)
-        self.ROI_Y2 = 0.9                    # ROI bottom boundary (0.0 - 1.0, relative to image height)
-        
-        # Camera Configuration
-        self.CAMERA_INDEX = 0                 # Camera device index
-        self.CAMERA_RESOLUTION = (640, 480)  # (width, height)
-        self.CAMERA_FPS = 30                  # Frames per second
-        self.USE_PICAMERA2 = True             # Use PiCamera2 instead of OpenCV camera
-        
-        # Processing Configuration
-        self.ENABLE_PREPROCESSING = True      # Enable image preprocessing
-        self.ENABLE_POSTPROCESSING = True     # Enable detection post-processing
-        self.MAX_DETECTIONS = 10              # Maximum number of detections to process
-        self.MIN_DETECTION_SIZE = 20          # Minimum detection size in pixels
-        
-        # Performance Configuration
-        self.NUM_THREADS = 4                  # Number of threads for TFLite interpreter
-        self.ENABLE_FPS_DISPLAY = True        # Show FPS on output
-        self.ENABLE_DETECTION_COUNT = True    # Show detection count on output
-        self.FRAME_SKIP = 0                   # Skip frames for performance (0 = process all)
-        
-        # Output Configuration
-        self.SAVE_DETECTIONS = True           # Save detected frames
-        self.OUTPUT_DIR = "saved_frames"      # Directory to save output
-        self.IMAGE_FORMAT = "jpg"             # Output image format
-        self.QUALITY = 95                     # JPEG quality (1-100)
-        
-        # Visualization Configuration
-        self.DRAW_BOUNDING_BOXES = True       # Draw detection boxes
-        self.DRAW_LABELS = True               # Draw confidence labels
-        self.BOX_COLOR = (0, 255, 0)         # BGR color for boxes
-        self.LABEL_COLOR = (0, 0, 0)         # BGR color for labels
-        self.LINE_THICKNESS = 2               # Thickness of bounding box lines
-        self.FONT_SCALE = 0.5                # Font scale for labels
-        
-        # Alert Configuration
-        self.ENABLE_ALERTS = True             # Enable detection alerts
-        self.ALERT_THRESHOLD = 1              # Minimum detections to trigger alert
-        self.ALERT_COOLDOWN = 5.0            # Seconds between alerts
-        
-        # Logging Configuration
-        self.ENABLE_LOGGING = True            # Enable logging
-        self.LOG_LEVEL = "INFO"               # Log level (DEBUG, INFO, WARNING, ERROR)
-        self.LOG_FILE = "milk_detection.log"  # Log file path
-        
-        # System Optimization
-        self.ENABLE_GPU_MEMORY = True         # Enable GPU memory allocation
-        self.GPU_MEMORY = 128                 # GPU memory in MB
-        self.OVERCLOCK_ENABLED = False        # Enable overclocking
-        self.TEMP_LIMIT = 70                  # Temperature limit in Celsius
-        
-        # Network Configuration (if using remote monitoring)
-        self.ENABLE_NETWORK = False           # Enable network features
-        self.HOST = "0.0.0.0"                # Host for network server
-        self.PORT = 8080                      # Port for network server
-        
-        # Validation
-        self._validate_config()
-    
-    def _validate_config(self):
-        """Validate configuration parameters"""
-        # Validate thresholds
-        if not 0.0 <= self.CONFIDENCE_THRESHOLD <= 1.0:
-            raise ValueError("CONFIDENCE_THRESHOLD must be between 0.0 and 1.0")
-        
-        if not 0.0 <= self.NMS_THRESHOLD <= 1.0:
-            raise ValueError("NMS_THRESHOLD must be between 0.0 and 1.0")
-        
-        if not 0.0 <= self.IOU_THRESHOLD <= 1.0:
-            raise ValueError("IOU_THRESHOLD must be between 0.0 and 1.0")
-        
-        # Validate ROI
-        if self.ENABLE_ROI:
-            if not (0.0 <= self.ROI_X1 < self.ROI_X2 <= 1.0):
-                raise ValueError("ROI X coordinates must be 0.0 <= X1 < X2 <= 1.0")
-            if not (0.0 <= self.ROI_Y1 < self.ROI_Y2 <= 1.0):
-                raise ValueError("ROI Y coordinates must be 0.0 <= Y1 < Y2 <= 1.0")
-        
-        # Validate camera settings
-        if self.CAMERA_FPS <= 0:
-            raise ValueError("CAMERA_FPS must be positive")
-        
-        if self.NUM_THREADS <= 0:
-            raise ValueError("NUM_THREADS must be positive")
+        self.reset()
+    
+    def reset(self):
+        """Restore every field to its default and drop the derived caches"""
+        for attr in self._FIELD_SLOTS:
+            try:
+                delattr(self, attr)
+            except AttributeError:
+                pass
+        self._roi_cache = {}  # (image_width, image_height) -> pixel ROI
+        self._invalidate_caches()
+    
+    def _invalidate_caches(self):
+        """Drop values derived from fields that have changed"""
+        self._roi_cache.clear()
+        self._model_path_cached = None
+        self._output_dir_cached = None
+        self._hot = None
+        self._dict_cache = None
+    
+    def snapshot(self):
+        """Immutable tuple of the parameters the detection loop reads every frame.
         
-        # Validate output settings
-        if not 1 <= self.QUALITY <= 100:
-            raise ValueError("QUALITY must be between 1 and 100")
+        Rebuilt only after one of them changes; bind it once per frame and
+        read p.conf, p.nms, ... instead of individual config attributes.
+        """
+        if self._hot is None:
+            if self.ENABLE_ROI:
+                self._check_roi_order()
+            self._hot = _HotParams(
+                self.CONFIDENCE_THRESHOLD, self.NMS_THRESHOLD, self.IOU_THRESHOLD,
+                self.MAX_DETECTIONS, self.MIN_DETECTION_SIZE, self.ENABLE_ROI,
+                (self.ROI_X1, self.ROI_Y1, self.ROI_X2, self.ROI_Y2))
+        return self._hot
+    
+    def _check_roi_order(self):
+        """Raise ValueError unless ROI_X1 < ROI_X2 and ROI_Y1 < ROI_Y2"""
+        # Field setters range-check each bound; the ordering between
+        # bounds can only be checked once they have all been set
+        if not self.ROI_X1 < self.ROI_X2:
+            raise ValueError("ROI X coordinates must be 0.0 <= X1 < X2 <= 1.0")
+        if not self.ROI_Y1 < self.ROI_Y2:
+            raise ValueError("ROI Y coordinates must be 0.0 <= Y1 < Y2 <= 1.0")
     
     def get_roi_coordinates(self, image_width, image_height):
         """Get ROI coordinates in pixels"""
-        if not self.ENABLE_ROI:
-            return (0, 0, image_width, image_height)
+        key = (image_width, image_height)
+        roi = self._roi_cache.get(key)
+        if roi is not None:
+            return roi
         
-        x1 = int(self.ROI_X1 * image_width)
-        y1 = int(self.ROI_Y1 * image_height)
-        x2 = int(self.ROI_X2 * image_width)
-        y2 = int(self.ROI_Y2 * image_height)
+        if not self.ENABLE_ROI:
+            roi = (0, 0, image_width, image_height)
+        else:
+            self._check_roi_order()
+            x1 = int(self.ROI_X1 * image_width)
+            y1 = int(self.ROI_Y1 * image_height)
+            x2 = int(self.ROI_X2 * image_width)
+            y2 = int(self.ROI_Y2 * image_height)
+            roi = (x1, y1, x2, y2)
         
-        return (x1, y1, x2, y2)
+        self._roi_cache[key] = roi
+        return roi
     
     def is_in_roi(self, detection, image_width, image_height):
         """Check if detection is within ROI"""
@@ -139,21 +228,47 @@ class DetectionConfig:
         
         return (roi_x1 <= center_x <= roi_x2 and roi_y1 <= center_y <= roi_y2)
     
+    def is_in_roi_batch(self, detections, image_width, image_height):
+        """Boolean mask of which rows of an (N, 6) detection array are within ROI"""
+        # reshape keeps an empty detection list (N = 0) two-dimensional
+        detections = np.asarray(detections, dtype=np.float32).reshape(-1, 6)
+        if not self.ENABLE_ROI:
+            return np.ones(len(detections), dtype=bool)
+        
+        roi_x1, roi_y1, roi_x2, roi_y2 = self.get_roi_coordinates(image_width, image_height)
+        
+        # Check if detection centers are within ROI
+        center_x = (detections[:, 0] + detections[:, 2]) * 0.5
+        center_y = (detections[:, 1] + detections[:, 3]) * 0.5
+        
+        return ((center_x >= roi_x1) & (center_x <= roi_x2) &
+                (center_y >= roi_y1) & (center_y <= roi_y2))
+    
     def get_model_path(self):
         """Get absolute path to model file"""
-        script_dir = Path(__file__).parent
-        model_path = script_dir / self.MODEL_PATH
-        return str(model_path)
+        if self._model_path_cached is None:
+            script_dir = Path(__file__).parent
+            self._model_path_cached = str(script_dir / self.MODEL_PATH)
+        return self._model_path_cached
     
     def get_output_dir(self):
         """Get absolute path to output directory"""
-        script_dir = Path(__file__).parent
-        output_dir = script_dir / self.OUTPUT_DIR
-        output_dir.mkdir(exist_ok=True)
-        return str(output_dir)
+        if self._output_dir_cached is None:
+            script_dir = Path(__file__).parent
+            output_dir = script_dir / self.OUTPUT_DIR
+            output_dir.mkdir(exist_ok=True)
+            self._output_dir_cached = str(output_dir)
+        return self._output_dir_cached
     
     def to_dict(self):
-        """Convert configuration to dictionary"""
+        """Convert configuration to a read-only dictionary view (cached until a field changes)"""
+        # The slot holds the plain dict so deepcopy and pickle still work;
+        # only the returned view is read-only
+        if self._dict_cache is None:
+            self._dict_cache = self._build_dict()
+        return MappingProxyType(self._dict_cache)
+    
+    def _build_dict(self):
         return {
             'model_path': self.MODEL_PATH,
             'confidence_threshold': self.CONFIDENCE_THRESHOLD,
@@ -172,24 +287,33 @@ class DetectionConfig:
             'alert_threshold': self.ALERT_THRESHOLD
         }
     
+    def format_config(self):
+        """Return the current configuration as printable text"""
+        lines = [
+            "=== Milk Detection Configuration ===",
+            f"Model Path: {self.MODEL_PATH}",
+            f"Confidence Threshold: {self.CONFIDENCE_THRESHOLD}",
+            f"NMS Threshold: {self.NMS_THRESHOLD}",
+            f"IOU Threshold: {self.IOU_THRESHOLD}",
+            f"ROI Enabled: {self.ENABLE_ROI}",
+        ]
+        if self.ENABLE_ROI:
+            lines.append(f"ROI: ({self.ROI_X1:.2f}, {self.ROI_Y1:.2f}) to ({self.ROI_X2:.2f}, {self.ROI_Y2:.2f})")
+        lines += [
+            f"Camera Resolution: {self.CAMERA_RESOLUTION}",
+            f"Camera FPS: {self.CAMERA_FPS}",
+            f"Use PiCamera2: {self.USE_PICAMERA2}",
+            f"Number of Threads: {self.NUM_THREADS}",
+            f"Max Detections: {self.MAX_DETECTIONS}",
+            f"Save Detections: {self.SAVE_DETECTIONS}",
+            f"Enable Alerts: {self.ENABLE_ALERTS}",
+            "==================================",
+        ]
+        return "\n".join(lines)
+    
     def print_config(self):
         """Print current configuration"""
-        print("=== Milk Detection Configuration ===")
-        print(f"Model Path: {self.MODEL_PATH}")
-        print(f"Confidence Threshold: {self.CONFIDENCE_THRESHOLD}")
-        print(f"NMS Threshold: {self.NMS_THRESHOLD}")
-        print(f"IOU Threshold: {self.IOU_THRESHOLD}")
-        print(f"ROI Enabled: {self.ENABLE_ROI}")
-        if self.ENABLE_ROI:
-            print(f"ROI: ({self.ROI_X1:.2f}, {self.ROI_Y1:.2f}) to ({self.ROI_X2:.2f}, {self.ROI_Y2:.2f})")
-        print(f"Camera Resolution: {self.CAMERA_RESOLUTION}")
-        print(f"Camera FPS: {self.CAMERA_FPS}")
-        print(f"Use PiCamera2: {self.USE_PICAMERA2}")
-        print(f"Number of Threads: {self.NUM_THREADS}")
-        print(f"Max Detections: {self.MAX_DETECTIONS}")
-        print(f"Save Detections: {self.SAVE_DETECTIONS}")
-        print(f"Enable Alerts: {self.ENABLE_ALERTS}")
-        print("==================================")
+        print(self.format_config())
 
 # Create global configuration instance
 config = DetectionConfig()
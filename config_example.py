@@ -4,87 +4,105 @@ Example script showing how to use the configuration file
 to control milk detection parameters
 """
 
+import io
+import sys
+
+import numpy as np
 from config import config
 
 def main():
     """Demonstrate configuration usage"""
     
+    # Collect the whole report and write it to stdout once at the end
+    buf = io.StringIO()
+    
     # Print current configuration
-    print("Current Configuration:")
-    config.print_config()
+    print("Current Configuration:", file=buf)
+    buf.write(config.format_config())
+    buf.write("\n")
     
     # Example 1: Adjust confidence threshold for more strict detection
-    print("\n=== Example 1: Strict Detection ===")
+    print("\n=== Example 1: Strict Detection ===", file=buf)
     config.CONFIDENCE_THRESHOLD = 0.8  # Only detect with 80%+ confidence
     config.NMS_THRESHOLD = 0.3         # More aggressive NMS
-    print(f"Adjusted confidence threshold to: {config.CONFIDENCE_THRESHOLD}")
-    print(f"Adjusted NMS threshold to: {config.NMS_THRESHOLD}")
+    print(f"Adjusted confidence threshold to: {config.CONFIDENCE_THRESHOLD}", file=buf)
+    print(f"Adjusted NMS threshold to: {config.NMS_THRESHOLD}", file=buf)
     
     # Example 2: Set ROI to focus on center area
-    print("\n=== Example 2: Center ROI ===")
+    print("\n=== Example 2: Center ROI ===", file=buf)
     config.ENABLE_ROI = True
     config.ROI_X1 = 0.25  # 25% from left
     config.ROI_Y1 = 0.25  # 25% from top
     config.ROI_X2 = 0.75  # 75% from left
     config.ROI_Y2 = 0.75  # 75% from top
-    print(f"ROI set to center area: ({config.ROI_X1:.2f}, {config.ROI_Y1:.2f}) to ({config.ROI_X2:.2f}, {config.ROI_Y2:.2f})")
+    print(f"ROI set to center area: ({config.ROI_X1:.2f}, {config.ROI_Y1:.2f}) to ({config.ROI_X2:.2f}, {config.ROI_Y2:.2f})", file=buf)
     
     # Example 3: Performance optimization
-    print("\n=== Example 3: Performance Optimization ===")
+    print("\n=== Example 3: Performance Optimization ===", file=buf)
     config.CAMERA_RESOLUTION = (320, 240)  # Lower resolution for speed
     config.CAMERA_FPS = 15                  # Lower FPS for stability
     config.NUM_THREADS = 2                  # Fewer threads for Pi Zero
     config.FRAME_SKIP = 1                   # Process every other frame
-    print(f"Optimized for performance: {config.CAMERA_RESOLUTION} @ {config.CAMERA_FPS}fps")
+    print(f"Optimized for performance: {config.CAMERA_RESOLUTION} @ {config.CAMERA_FPS}fps", file=buf)
     
     # Example 4: High quality detection
-    print("\n=== Example 4: High Quality Detection ===")
+    print("\n=== Example 4: High Quality Detection ===", file=buf)
     config.CAMERA_RESOLUTION = (1280, 720)  # HD resolution
     config.CAMERA_FPS = 30                  # Full FPS
     config.QUALITY = 100                    # Maximum JPEG quality
     config.SAVE_DETECTIONS = True           # Save all detections
-    print(f"High quality mode: {config.CAMERA_RESOLUTION} @ {config.CAMERA_FPS}fps")
+    print(f"High quality mode: {config.CAMERA_RESOLUTION} @ {config.CAMERA_FPS}fps", file=buf)
     
     # Example 5: Custom visualization
-    print("\n=== Example 5: Custom Visualization ===")
+    print("\n=== Example 5: Custom Visualization ===", file=buf)
     config.BOX_COLOR = (255, 0, 0)         # Red boxes
     config.LABEL_COLOR = (255, 255, 255)    # White labels
     config.LINE_THICKNESS = 3               # Thicker lines
     config.FONT_SCALE = 0.7                 # Larger font
-    print("Custom visualization applied")
+    print("Custom visualization applied", file=buf)
     
     # Example 6: Alert configuration
-    print("\n=== Example 6: Alert Settings ===")
+    print("\n=== Example 6: Alert Settings ===", file=buf)
     config.ENABLE_ALERTS = True
     config.ALERT_THRESHOLD = 3              # Alert when 3+ detections
     config.ALERT_COOLDOWN = 10.0            # 10 second cooldown
-    print(f"Alerts enabled: {config.ALERT_THRESHOLD}+ detections, {config.ALERT_COOLDOWN}s cooldown")
+    print(f"Alerts enabled: {config.ALERT_THRESHOLD}+ detections, {config.ALERT_COOLDOWN}s cooldown", file=buf)
     
     # Example 7: ROI validation
-    print("\n=== Example 7: ROI Validation ===")
+    print("\n=== Example 7: ROI Validation ===", file=buf)
     image_width, image_height = 640, 480
     roi_coords = config.get_roi_coordinates(image_width, image_height)
-    print(f"ROI coordinates for {image_width}x{image_height}: {roi_coords}")
+    print(f"ROI coordinates for {image_width}x{image_height}: {roi_coords}", file=buf)
     
     # Test ROI filtering
     test_detection = [100, 100, 200, 200, 0.9, 0]  # x1, y1, x2, y2, conf, class
     in_roi = config.is_in_roi(test_detection, image_width, image_height)
-    print(f"Test detection {test_detection[:4]} is {'IN' if in_roi else 'OUTSIDE'} ROI")
+    print(f"Test detection {test_detection[:4]} is {'IN' if in_roi else 'OUTSIDE'} ROI", file=buf)
+    
+    # Filter a whole frame's detections at once
+    detections = np.array([test_detection, [300, 200, 360, 260, 0.8, 0]])
+    kept = detections[config.is_in_roi_batch(detections, image_width, image_height)]
+    print(f"{len(kept)} of {len(detections)} detections are inside the ROI", file=buf)
+    
+    # A frame with no detections gives an empty mask
+    empty_mask = config.is_in_roi_batch([], image_width, image_height)
+    assert empty_mask.shape == (0,) and empty_mask.dtype == bool
+    print(f"Empty frame: {len(empty_mask)} detections checked", file=buf)
     
     # Example 8: Configuration export
-    print("\n=== Example 8: Configuration Export ===")
+    print("\n=== Example 8: Configuration Export ===", file=buf)
     config_dict = config.to_dict()
-    print("Configuration as dictionary:")
+    print("Configuration as dictionary:", file=buf)
     for key, value in config_dict.items():
-        print(f"  {key}: {value}")
+        print(f"  {key}: {value}", file=buf)
     
     # Example 9: Reset to defaults
-    print("\n=== Example 9: Reset to Defaults ===")
-    config.__init__()  # Reset to default values
-    print("Configuration reset to defaults")
+    print("\n=== Example 9: Reset to Defaults ===", file=buf)
+    config.reset()  # Reset to default values
+    print("Configuration reset to defaults", file=buf)
     
     # Example 10: Custom configuration
-    print("\n=== Example 10: Custom Configuration ===")
+    print("\n=== Example 10: Custom Configuration ===", file=buf)
     # You can create multiple config instances for different scenarios
     class CustomConfig:
         def __init__(self):
@@ -93,7 +111,9 @@ def main():
             self.CAMERA_RESOLUTION = (800, 600)
     
     custom = CustomConfig()
-    print(f"Custom config: confidence={custom.CONFIDENCE_THRESHOLD}, ROI={custom.ENABLE_ROI}")
+    print(f"Custom config: confidence={custom.CONFIDENCE_THRESHOLD}, ROI={custom.ENABLE_ROI}", file=buf)
+    
+    sys.stdout.write(buf.getvalue())
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
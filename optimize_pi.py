@@ -5,23 +5,106 @@ Helps find optimal settings for real-time performance
 """
 
 import subprocess
-import time
 import psutil
 import os
 import sys
+import importlib
+from functools import lru_cache
+
+@lru_cache(maxsize=None)
+def _try_import(name):
+    """Import a module once and remember the result, None if unavailable.
+    
+    Failed imports are not cached by Python, so probing a missing module
+    twice would walk sys.path twice.
+    """
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+def _probe_module(name, timeout=10):
+    """Check a module imports in a child interpreter: (ok, version or None).
+    
+    Keeps heavy native libraries (and their import-time side effects) out
+    of this process when all we need to know is whether they load.
+    """
+    code = f"import {name} as m; print(getattr(m, '__version__', ''))"
+    try:
+        result = subprocess.run([sys.executable, '-c', code],
+                                capture_output=True, text=True, timeout=timeout)
+    except (OSError, subprocess.TimeoutExpired):
+        return False, None
+    return result.returncode == 0, result.stdout.strip() or None
+
+@lru_cache(maxsize=1)
+def _system_info():
+    """Read the OS name and board model once; both files are static"""
+    os_name = None
+    try:
+        with open('/etc/os-release') as f:
+            for line in f:
+                if line.startswith('PRETTY_NAME='):
+                    os_name = line.partition('=')[2].strip().strip('"')
+                    break
+    except OSError:
+        pass
+    
+    # The device tree holds just the model string, unlike the whole of
+    # /proc/cpuinfo; fall back to cpuinfo's "Model" line without it
+    model = None
+    try:
+        with open('/proc/device-tree/model') as f:
+            model = f.read().strip('\x00 \n')
+    except OSError:
+        try:
+            with open('/proc/cpuinfo') as f:
+                for line in f:
+                    if line.startswith('Model'):
+                        model = line.partition(':')[2].strip()
+                        break
+        except OSError:
+            pass
+    
+    return os_name, model
+
+def _read_sysfs_int(path):
+    """Read an integer from a sysfs file, None if unavailable"""
+    try:
+        with open(path) as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return None
+
+# Temperature and clocks come straight from sysfs; vcgencmd is only needed
+# for what the kernel doesn't expose
+VCGENCMD_QUERIES = ("get_mem gpu", "get_camera")
+
+@lru_cache(maxsize=1)
+def read_vcgencmd():
+    """Run all vcgencmd queries in a single shell (one fork/exec) and cache the result"""
+    script = "; echo ---; ".join(f"vcgencmd {q}" for q in VCGENCMD_QUERIES)
+    try:
+        result = subprocess.run(['sh', '-c', script], capture_output=True, text=True)
+    except Exception:
+        return {}
+    sections = result.stdout.split('---')
+    return {q: out.strip() for q, out in zip(VCGENCMD_QUERIES, sections) if out.strip()}
 
 def check_system_info():
-    """Check Raspberry Pi system information"""
+    """Check Raspberry Pi system information, returning what the report needs"""
     print("🔍 Checking Raspberry Pi System Information...")
+    status = {'temp_c': None}
     
     try:
-        # Check CPU info
-        with open('/proc/cpuinfo', 'r') as f:
-            cpu_info = f.read()
-            if 'Raspberry Pi' in cpu_info:
-                print("✅ Raspberry Pi detected")
-            else:
-                print("⚠️  Not running on Raspberry Pi")
+        # Check board model
+        os_name, model = _system_info()
+        if model and 'Raspberry Pi' in model:
+            print(f"✅ Raspberry Pi detected: {model}")
+        else:
+            print("⚠️  Not running on Raspberry Pi")
+        if os_name:
+            print(f"🐧 OS: {os_name}")
         
         # Check memory
         memory = psutil.virtual_memory()
@@ -31,39 +114,56 @@ def check_system_info():
         cpu_count = psutil.cpu_count()
         print(f"🖥️  CPU Cores: {cpu_count}")
         
+        vcgencmd = read_vcgencmd()
+        
         # Check temperature
-        try:
-            temp = subprocess.check_output(['vcgencmd', 'measure_temp']).decode()
-            print(f"🌡️  Temperature: {temp.strip()}")
-        except:
+        temp = _read_sysfs_int('/sys/class/thermal/thermal_zone0/temp')
+        if temp is not None:
+            status['temp_c'] = temp / 1000
+            print(f"🌡️  Temperature: {temp / 1000:.1f}'C")
+        else:
             print("🌡️  Temperature: Unable to read")
+        
+        # Check ARM clock
+        freq = _read_sysfs_int('/sys/devices/system/cpu/cpu0/cpufreq/scaling_cur_freq')
+        if freq is not None:
+            print(f"⏱️  ARM Clock: {freq / 1000:.0f} MHz")
             
         # Check GPU memory
-        try:
-            gpu_mem = subprocess.check_output(['vcgencmd', 'get_mem', 'gpu']).decode()
-            print(f"🎮 GPU Memory: {gpu_mem.strip()}")
-        except:
+        gpu_mem = vcgencmd.get('get_mem gpu')
+        if gpu_mem:
+            print(f"🎮 GPU Memory: {gpu_mem}")
+        else:
             print("🎮 GPU Memory: Unable to read")
             
     except Exception as e:
         print(f"❌ Error checking system info: {e}")
+    
+    return status
 
 def check_camera():
-    """Check camera availability"""
+    """Check camera availability, returning which probes passed"""
     print("\n📷 Checking Camera...")
+    status = {'picamera2': False, 'opencv': False, 'opencv_camera': False, 'camera_detected': None}
     
-    # Check PiCamera2
-    try:
-        import picamera2
-        print("✅ PiCamera2 available")
-    except ImportError:
+    # Check PiCamera2 (in a child: importing it starts libcamera's camera manager)
+    ok, version = _probe_module('picamera2')
+    if ok:
+        status['picamera2'] = True
+        print(f"✅ PiCamera2 available{f' ({version})' if version else ''}")
+    else:
         print("❌ PiCamera2 not available")
     
     # Check OpenCV camera
+    cv2 = _try_import('cv2')
+    if cv2 is None:
+        print("❌ OpenCV not available")
+        return status
+    status['opencv'] = True
     try:
-        import cv2
         cap = cv2.VideoCapture(0)
         if cap.isOpened():
+            status['opencv_camera'] = True
             print("✅ OpenCV camera available")
             cap.release()
         else:
@@ -71,81 +171,97 @@ def check_camera():
     except:
         print("❌ OpenCV camera error")
     
-    # Check camera interface
-    try:
-        result = subprocess.run(['vcgencmd', 'get_camera'], capture_output=True, text=True)
-        if result.returncode == 0:
-            print(f"📹 Camera Interface: {result.stdout.strip()}")
-    except:
+    # Check camera interface ("supported=1 detected=1, libcamera interfaces=0")
+    camera = read_vcgencmd().get('get_camera')
+    if camera:
+        status['camera_detected'] = 'detected=0' not in camera
+        print(f"📹 Camera Interface: {camera}")
+    else:
         print("📹 Camera Interface: Unable to check")
+    
+    return status
 
 def check_tflite():
     """Check TFLite runtime"""
     print("\n🤖 Checking TFLite Runtime...")
     
-    try:
-        import tflite_runtime.interpreter as tflite
+    if _try_import('tflite_runtime.interpreter') is not None:
         print("✅ tflite-runtime available (optimized for Pi)")
-    except ImportError:
-        try:
-            import tensorflow as tf
-            print("⚠️  Using tensorflow (not optimized for Pi)")
-        except ImportError:
-            print("❌ No TFLite runtime available")
-            return False
+    elif _try_import('tensorflow') is not None:
+        print("⚠️  Using tensorflow (not optimized for Pi)")
+    else:
+        print("❌ No TFLite runtime available")
+        return False
     return True
 
-def run_performance_test():
+def run_performance_test(model_path="model/best_float32.tflite", duration_s=10.0):
     """Run performance test with different settings"""
     print("\n🚀 Running Performance Tests...")
     
     test_configs = [
-        {"resolution": "320x240", "fps": 15, "mode": "speed"},
-        {"resolution": "640x480", "fps": 15, "mode": "balanced"},
-        {"resolution": "1280x720", "fps": 10, "mode": "quality"},
+        {"resolution": (320, 240), "fps": 15, "mode": "speed"},
+        {"resolution": (640, 480), "fps": 15, "mode": "balanced"},
+        {"resolution": (1280, 720), "fps": 10, "mode": "quality"},
     ]
     
+    # PERFORMANCE OPTIMIZATION: Load the model once and sweep the settings
+    # in-process instead of starting a detector subprocess per config
+    try:
+        from raspberry_milk_detector import RaspberryMilkDetector
+        detector = RaspberryMilkDetector(model_path)
+    except Exception as e:
+        print(f"❌ Could not load detector: {e}")
+        return []
+    
     results = []
     
     for config in test_configs:
-        print(f"\n🧪 Testing: {config['resolution']} @ {config['fps']} FPS ({config['mode']} mode)")
-        
-        # Run detection for 10 seconds
-        cmd = [
-            "python3", "raspberry_milk_detector.py",
-            "--resolution", config["resolution"],
-            "--target-fps", str(config["fps"]),
-            "--performance-mode", config["mode"],
-            "--use-picamera2"
-        ]
+        width, height = config["resolution"]
+        print(f"\n🧪 Testing: {width}x{height} @ {config['fps']} FPS ({config['mode']} mode)")
         
         try:
-            # Start the process
-            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            
-            # Let it run for 10 seconds
-            time.sleep(10)
-            
-            # Terminate gracefully
-            process.terminate()
-            process.wait(timeout=5)
-            
-            print(f"✅ Test completed for {config['resolution']}")
-            results.append(config)
-            
-        except subprocess.TimeoutExpired:
-            process.kill()
-            print(f"❌ Test failed for {config['resolution']}")
+            result = detector.run_benchmark(config["resolution"], config["fps"],
+                                            config["mode"], duration_s)
+            print(f"✅ Test completed for {result['resolution']}")
+            results.append(result)
         except Exception as e:
-            print(f"❌ Error testing {config['resolution']}: {e}")
+            print(f"❌ Error testing {width}x{height}: {e}")
+    
+    if results:
+        print("\n📈 Results:")
+        print(f"   {'Resolution':<11} {'Mode':<9} {'FPS':>6} {'Inference':>12}")
+        for r in results:
+            print(f"   {r['resolution']:<11} {r['mode']:<9} {r['fps']:6.1f} {r['inference_ms']:9.1f} ms")
     
     return results
 
-def generate_optimization_report():
+def suggest_fixes(status):
+    """Print remediation steps only for the checks that actually failed"""
+    fixes = []
+    if status.get('picamera2') is False:
+        fixes.append("Install PiCamera2: sudo apt install -y python3-picamera2")
+    if status.get('opencv') is False:
+        fixes.append("Install OpenCV: pip3 install opencv-python")
+    if status.get('camera_detected') is False:
+        fixes.append("Check the camera ribbon cable, then run: libcamera-hello --list-cameras")
+    temp = status.get('temp_c')
+    if temp is not None and temp >= 70:
+        fixes.append(f"Improve cooling (currently {temp:.1f}°C, throttling starts around 80°C)")
+    
+    if not fixes:
+        return
+    print("\n🩹 Fixes for Detected Issues:")
+    for i, fix in enumerate(fixes, 1):
+        print(f"{i}. {fix}")
+
+def generate_optimization_report(status=None):
     """Generate optimization recommendations"""
     print("\n📊 Performance Optimization Report")
     print("=" * 50)
     
+    if status:
+        suggest_fixes(status)
+    
     print("\n🎯 Quick Wins:")
     print("1. Use PiCamera2 instead of USB camera")
     print("2. Lower resolution to 320x240 or 640x480")
@@ -163,9 +279,13 @@ def generate_optimization_report():
     print("\n🔧 System Optimizations:")
     print("1. Close unnecessary applications")
     print("2. Disable Bluetooth: sudo systemctl stop bluetooth")
+    print("   Disable mDNS: sudo systemctl disable --now avahi-daemon.socket avahi-daemon.service")
     print("3. Disable WiFi if using Ethernet")
     print("4. Increase GPU memory in raspi-config")
     print("5. Ensure adequate cooling (temperature < 70°C)")
+    print("6. Use the 'performance' CPU governor instead of force_turbo=1:")
+    print("   echo performance | sudo tee /sys/devices/system/cpu/cpu*/cpufreq/scaling_governor")
+    print("   (force_turbo pins max clocks and hits the thermal throttle under sustained load)")
     
     print("\n📱 Runtime Controls:")
     print("Press '1' - Process every frame (best quality)")
@@ -185,8 +305,8 @@ def main():
         return
     
     # System checks
-    check_system_info()
-    check_camera()
+    status = check_system_info()
+    status.update(check_camera())
     
     if not check_tflite():
         print("\n❌ TFLite runtime not available. Please install dependencies first.")
@@ -195,7 +315,7 @@ def main():
     
     # Ask user if they want to run performance tests
     print("\n🧪 Would you like to run performance tests? (y/n)")
-    print("Note: This will start the detector multiple times for testing")
+    print("Note: This loads the model once and benchmarks each setting for 10 seconds")
     
     try:
         user_input = input("Run tests? (y/n): ").lower().strip()
@@ -205,7 +325,7 @@ def main():
         print("\n⏹️  Tests interrupted by user")
     
     # Generate recommendations
-    generate_optimization_report()
+    generate_optimization_report(status)
     
     print("\n🎉 Optimization complete!")
     print("Use the recommended settings above to improve your FPS.")
@@ -4,115 +4,344 @@ Performance Monitor for Raspberry Pi Milk Detection
 Monitors CPU, memory, temperature, and FPS in real-time
 """
 
-import psutil
+import re
 import time
 import subprocess
 import os
 import signal
+import select
 import sys
 from datetime import datetime
 
+# orjson is optional: only used to serialize --json records faster
+try:
+    import orjson
+    
+    def _dumps(obj):
+        return orjson.dumps(obj).decode()
+except ImportError:
+    import json
+    
+    def _dumps(obj):
+        return json.dumps(obj, separators=(',', ':'))
+
+THERMAL_ZONE = '/sys/class/thermal/thermal_zone0/temp'               # millidegrees C
+CPU_FREQ = '/sys/devices/system/cpu/cpu0/cpufreq/scaling_cur_freq'     # kHz
+CORE_CLK_RATE = '/sys/kernel/debug/clk/core/clk_rate'                 # Hz, needs debugfs access
+PROC_STAT = '/proc/stat'
+PROC_MEMINFO = '/proc/meminfo'
+
+# /proc/meminfo lines _read_memory() needs; the last three only matter when
+# MemAvailable is missing
+MEMINFO_FIELDS = ('MemTotal', 'MemAvailable', 'MemFree', 'Buffers', 'Cached')
+
+# Shortest /proc/stat window get_cpu_usage() computes a percentage over;
+# a handful of jiffies gives 0% or 100% noise
+CPU_MIN_INTERVAL = 0.1  # seconds
+
+def _open_sysfs(path):
+    """Open a sysfs file for repeated pread(), None if unavailable"""
+    try:
+        return os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+
+def _pread_int(fd):
+    """Re-read an integer from an open sysfs descriptor, None on failure"""
+    if fd is None:
+        return None
+    try:
+        return int(os.pread(fd, 32, 0))
+    except (OSError, ValueError):
+        return None
+
+def _pread_text(fd, size=4096):
+    """Re-read a small /proc file from an open descriptor, None on failure"""
+    if fd is None:
+        return None
+    try:
+        return os.pread(fd, size, 0).decode()
+    except OSError:
+        return None
+
+# ANSI: clear screen and move the cursor home (what `clear` prints)
+CLEAR_SCREEN = '\x1b[2J\x1b[H'
+
+# PERFORMANCE OPTIMIZATION: vcgencmd forks a process per query. Feed all
+# readings to one long-lived shell over a pipe and reuse the answers for a
+# few seconds. Failures are cached too, so boards without vcgencmd don't
+# retry every tick.
+VCGENCMD_TTL = 5.0
+VCGENCMD_QUERIES = ('measure_temp', 'measure_clock arm', 'measure_clock core')
+_vcgencmd_cache = {}  # 'ts' -> monotonic timestamp, 'values' -> {query: float or None}
+_vcgencmd_shell = None  # started on first use, see _vcgencmd_lines()
+
+# Reads one query per line and answers with exactly one line each;
+# '|| echo' keeps the answers aligned when a query fails
+_VCGENCMD_LOOP = 'while read -r q; do vcgencmd $q 2>/dev/null || echo; done'
+
+# Value of "temp=48.3'C" / "frequency(48)=1500000000", matched on raw bytes
+_VAL_RE = re.compile(rb"=\s*([0-9.]+)")
+
+def _vcgencmd_bundle(ttl=VCGENCMD_TTL):
+    """All vcgencmd readings (parsed to floats) from a single invocation, at most once per ttl seconds"""
+    now = time.monotonic()
+    if _vcgencmd_cache and now - _vcgencmd_cache['ts'] < ttl:
+        return _vcgencmd_cache['values']
+    
+    lines = _vcgencmd_lines(VCGENCMD_QUERIES)
+    
+    # Parse once per refresh rather than once per getter call
+    values = {}
+    for i, query in enumerate(VCGENCMD_QUERIES):
+        match = _VAL_RE.search(lines[i]) if i < len(lines) else None
+        values[query] = float(match.group(1)) if match else None
+    
+    _vcgencmd_cache['ts'] = now
+    _vcgencmd_cache['values'] = values
+    return values
+
+def _vcgencmd_lines(queries):
+    """One raw output line per query from the long-lived vcgencmd shell"""
+    global _vcgencmd_shell
+    try:
+        if _vcgencmd_shell is None:
+            _vcgencmd_shell = subprocess.Popen(['sh', '-c', _VCGENCMD_LOOP],
+                                               stdin=subprocess.PIPE,
+                                               stdout=subprocess.PIPE)
+        _vcgencmd_shell.stdin.write(''.join(q + '\n' for q in queries).encode())
+        _vcgencmd_shell.stdin.flush()
+        lines = [_vcgencmd_shell.stdout.readline() for _ in queries]
+    except OSError:
+        _close_vcgencmd()
+        return []
+    
+    if not lines[-1]:
+        # Shell exited (EOF); start a fresh one next refresh
+        _close_vcgencmd()
+    return lines
+
+def _close_vcgencmd():
+    """Stop the vcgencmd shell, if one was started"""
+    global _vcgencmd_shell
+    if _vcgencmd_shell is None:
+        return
+    shell, _vcgencmd_shell = _vcgencmd_shell, None
+    try:
+        shell.stdin.close()  # EOF ends the read loop
+    except OSError:
+        pass
+    try:
+        shell.wait(timeout=1)
+    except subprocess.TimeoutExpired:
+        shell.kill()
+        shell.wait()
+    shell.stdout.close()
+
 class PerformanceMonitor:
     def __init__(self, interval=1.0):
         self.interval = interval
         self.running = False
         self.start_time = time.time()
         self.fps_samples = []
+        self._wake_r = self._wake_w = None
+        
+        # PERFORMANCE OPTIMIZATION: Keep the sysfs files open and pread()
+        # them each tick instead of forking vcgencmd
+        self._temp_fd = _open_sysfs(THERMAL_ZONE)
+        self._cpu_freq_fd = _open_sysfs(CPU_FREQ)
+        self._core_clk_fd = _open_sysfs(CORE_CLK_RATE)
+        
+        # PERFORMANCE OPTIMIZATION: Same for /proc/stat and /proc/meminfo,
+        # parsed by hand rather than re-opened on every call
+        self._stat_fd = _open_sysfs(PROC_STAT)
+        self._meminfo_fd = _open_sysfs(PROC_MEMINFO)
+        
+        # CPU usage is measured between successive calls, not by sleeping
+        self._prev_cpu_times = self._read_cpu_times()
+        self._prev_cpu_clock = time.monotonic()
+        
+        # Fixed for the life of the process: look them up once
+        self._cpu_count = os.cpu_count()
+        self._mem_total_gb = self._read_memory()[0] / (1024**3)
+        disk = os.statvfs('/')
+        self._disk_total_gb = disk.f_blocks * disk.f_frsize / (1024**3)
         
     def get_cpu_temp(self):
         """Get CPU temperature"""
-        try:
-            temp = subprocess.check_output(['vcgencmd', 'measure_temp']).decode()
-            return float(temp.replace('temp=', '').replace("'C", ''))
-        except:
-            return None
+        temp = _pread_int(self._temp_fd)
+        if temp is not None:
+            return temp / 1000.0
+        return _vcgencmd_bundle()['measure_temp']
     
     def get_cpu_freq(self):
         """Get CPU frequency"""
-        try:
-            freq = subprocess.check_output(['vcgencmd', 'measure_clock', 'arm']).decode()
-            return int(freq.split('=')[1]) / 1000000  # Convert to MHz
-        except:
-            return None
+        freq = _pread_int(self._cpu_freq_fd)
+        if freq is not None:
+            return freq / 1000  # kHz to MHz
+        freq = _vcgencmd_bundle()['measure_clock arm']
+        return freq / 1000000 if freq is not None else None  # Convert to MHz
     
     def get_gpu_freq(self):
         """Get GPU frequency"""
-        try:
-            freq = subprocess.check_output(['vcgencmd', 'measure_clock', 'core']).decode()
-            return int(freq.split('=')[1]) / 1000000  # Convert to MHz
-        except:
-            return None
+        freq = _pread_int(self._core_clk_fd)
+        if freq is not None:
+            return freq / 1000000  # Convert to MHz
+        freq = _vcgencmd_bundle()['measure_clock core']
+        return freq / 1000000 if freq is not None else None  # Convert to MHz
+    
+    def _read_memory(self):
+        """(total, available) bytes from /proc/meminfo"""
+        meminfo = _pread_text(self._meminfo_fd)
+        if meminfo is None:
+            # No /proc: sysconf's free-page count stands in for MemAvailable
+            page = os.sysconf('SC_PAGE_SIZE')
+            return os.sysconf('SC_PHYS_PAGES') * page, os.sysconf('SC_AVPHYS_PAGES') * page
+        
+        fields = {}
+        for line in meminfo.splitlines():
+            key, _, value = line.partition(':')
+            if key in MEMINFO_FIELDS:
+                fields[key] = int(value.split()[0]) * 1024  # kB
+                if len(fields) == len(MEMINFO_FIELDS):
+                    break
+        available = fields.get('MemAvailable')
+        if available is None:
+            # Kernels before 3.14 have no MemAvailable: free plus reclaimable
+            # page cache is the usual estimate
+            available = fields['MemFree'] + fields.get('Buffers', 0) + fields.get('Cached', 0)
+        return fields['MemTotal'], available
     
     def get_memory_info(self):
         """Get memory information"""
-        memory = psutil.virtual_memory()
+        total, available = self._read_memory()
+        used = total - available
         return {
-            'total': memory.total / (1024**3),  # GB
-            'used': memory.used / (1024**3),    # GB
-            'percent': memory.percent
+            'total': self._mem_total_gb,        # GB
+            'used': used / (1024**3),           # GB
+            'percent': 100.0 * used / total,
+            'total_bytes': total,
+            'used_bytes': used
         }
     
+    def _read_cpu_times(self):
+        """(total, idle) jiffies from the aggregate 'cpu' line of /proc/stat"""
+        stat = _pread_text(self._stat_fd)
+        if stat is None:
+            return 0, 0  # No /proc: usage reads as 0%
+        
+        # user nice system idle iowait irq softirq steal [guest guest_nice];
+        # guest time is already counted in user/nice
+        values = [int(v) for v in stat[:stat.index('\n')].split()[1:9]]
+        return sum(values), values[3] + values[4]
+    
+    def get_cpu_usage(self):
+        """CPU usage since the previous call, from /proc/stat deltas
+        
+        Only blocks when called less than CPU_MIN_INTERVAL after the previous
+        sample (e.g. --summary right after start-up), sleeping out the rest.
+        """
+        wait = self._prev_cpu_clock + CPU_MIN_INTERVAL - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        cur_total, cur_idle = self._read_cpu_times()
+        prev_total, prev_idle = self._prev_cpu_times
+        self._prev_cpu_times = (cur_total, cur_idle)
+        self._prev_cpu_clock = time.monotonic()
+        
+        total = cur_total - prev_total
+        if total <= 0:
+            return 0.0
+        idle = cur_idle - prev_idle
+        return max(0.0, min(100.0, 100.0 * (1.0 - idle / total)))
+    
     def get_cpu_info(self):
         """Get CPU information"""
+        # scaling_cur_freq via the open descriptor, rather than calling
+        # /proc/cpuinfo to re-parse it on every tick
+        freq = self.get_cpu_freq()
         return {
-            'percent': psutil.cpu_percent(interval=0.1),
-            'count': psutil.cpu_count(),
-            'freq': psutil.cpu_freq().current / 1000 if psutil.cpu_freq() else None  # GHz
+            'percent': self.get_cpu_usage(),
+            'count': self._cpu_count,
+            'freq': freq / 1000 if freq is not None else None  # GHz
         }
     
     def get_disk_info(self):
         """Get disk information"""
-        disk = psutil.disk_usage('/')
+        disk = os.statvfs('/')
+        total = disk.f_blocks * disk.f_frsize
+        used = (disk.f_blocks - disk.f_bfree) * disk.f_frsize
         return {
-            'total': disk.total / (1024**3),  # GB
-            'used': disk.used / (1024**3),    # GB
-            'percent': (disk.used / disk.total) * 100
+            'total': self._disk_total_gb,     # GB
+            'used': used / (1024**3),         # GB
+            'percent': (used / total) * 100,
+            'total_bytes': total,
+            'used_bytes': used
         }
     
     def print_header(self):
         """Print monitoring header"""
-        os.system('clear')
-        print("🍓 Raspberry Pi Performance Monitor")
-        print("=" * 50)
-        print(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        print(f"Interval: {self.interval}s | Press Ctrl+C to stop")
-        print("-" * 50)
+        header = [
+            "🍓 Raspberry Pi Performance Monitor",
+            "=" * 50,
+            f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+            f"Interval: {self.interval}s | Press Ctrl+C to stop",
+            "-" * 50,
+        ]
+        sys.stdout.write(CLEAR_SCREEN + '\n'.join(header) + '\n')
+        sys.stdout.flush()
+        
+        # Stats are repainted in place starting on the row below the header
+        self._stats_row = len(header) + 1
+        self._last_lines = []
     
-    def print_stats(self):
-        """Print current statistics"""
-        # Get system info
+    def _sample(self):
+        """Read every source once for one refresh"""
+        # PERFORMANCE OPTIMIZATION: Each file is read exactly once per tick;
+        # the display and the warnings below both work from this snapshot
         cpu_info = self.get_cpu_info()
-        memory_info = self.get_memory_info()
-        disk_info = self.get_disk_info()
-        cpu_temp = self.get_cpu_temp()
-        cpu_freq = self.get_cpu_freq()
-        gpu_freq = self.get_gpu_freq()
+        return {
+            'cpu': cpu_info,
+            'memory': self.get_memory_info(),
+            'disk': self.get_disk_info(),
+            'cpu_temp': self.get_cpu_temp(),
+            'cpu_freq': cpu_info['freq'] * 1000 if cpu_info['freq'] is not None else None,  # MHz
+            'gpu_freq': self.get_gpu_freq(),
+        }
+    
+    def format_stats(self):
+        """Current statistics as a list of display lines"""
+        sample = self._sample()
+        cpu_info = sample['cpu']
+        memory_info = sample['memory']
+        disk_info = sample['disk']
+        cpu_temp = sample['cpu_temp']
+        cpu_freq = sample['cpu_freq']
+        gpu_freq = sample['gpu_freq']
         
         # Calculate uptime
         uptime = time.time() - self.start_time
         
-        # Print statistics
-        print(f"\n⏱️  Uptime: {uptime:.0f}s")
+        lines = ["", f"⏱️  Uptime: {uptime:.0f}s"]
         
-        print(f"\n🖥️  CPU:")
-        print(f"   Usage: {cpu_info['percent']:5.1f}%")
-        print(f"   Cores: {cpu_info['count']}")
+        lines += ["", "🖥️  CPU:",
+                  f"   Usage: {cpu_info['percent']:5.1f}%",
+                  f"   Cores: {cpu_info['count']}"]
         if cpu_freq:
-            print(f"   Freq:  {cpu_freq:5.0f} MHz")
+            lines.append(f"   Freq:  {cpu_freq:5.0f} MHz")
         if cpu_temp:
-            print(f"   Temp:  {cpu_temp:5.1f}°C")
+            lines.append(f"   Temp:  {cpu_temp:5.1f}°C")
         
-        print(f"\n💾 Memory:")
-        print(f"   Used:  {memory_info['used']:5.1f} GB / {memory_info['total']:5.1f} GB")
-        print(f"   Usage: {memory_info['percent']:5.1f}%")
+        lines += ["", "💾 Memory:",
+                  f"   Used:  {memory_info['used']:5.1f} GB / {memory_info['total']:5.1f} GB",
+                  f"   Usage: {memory_info['percent']:5.1f}%"]
         
-        print(f"\n💿 Disk:")
-        print(f"   Used:  {disk_info['used']:5.1f} GB / {disk_info['total']:5.1f} GB")
-        print(f"   Usage: {disk_info['percent']:5.1f}%")
+        lines += ["", "💿 Disk:",
+                  f"   Used:  {disk_info['used']:5.1f} GB / {disk_info['total']:5.1f} GB",
+                  f"   Usage: {disk_info['percent']:5.1f}%"]
         
         if gpu_freq:
-            print(f"\n🎮 GPU:")
-            print(f"   Freq:  {gpu_freq:5.0f} MHz")
+            lines += ["", "🎮 GPU:", f"   Freq:  {gpu_freq:5.0f} MHz"]
         
         # Performance warnings
         warnings = []
@@ -124,36 +353,139 @@ class PerformanceMonitor:
             warnings.append(f"⚠️  CPU usage high: {cpu_info['percent']:.1f}%")
         
         if warnings:
-            print(f"\n🚨 Warnings:")
-            for warning in warnings:
-                print(f"   {warning}")
+            lines += ["", "🚨 Warnings:"]
+            lines += [f"   {warning}" for warning in warnings]
         
         # Performance tips
-        print(f"\n💡 Tips:")
+        lines += ["", "💡 Tips:"]
         if cpu_temp and cpu_temp > 60:
-            print("   • Consider improving cooling")
+            lines.append("   • Consider improving cooling")
         if memory_info['percent'] > 80:
-            print("   • Close unnecessary applications")
+            lines.append("   • Close unnecessary applications")
         if cpu_info['percent'] > 80:
-            print("   • Reduce detection resolution or FPS")
+            lines.append("   • Reduce detection resolution or FPS")
+        
+        return lines
+    
+    def format_json(self):
+        """Current statistics as one compact JSON line with raw units"""
+        sample = self._sample()
+        cpu_temp = sample['cpu_temp']
+        cpu_freq = sample['cpu_freq']
+        gpu_freq = sample['gpu_freq']
+        return _dumps({
+            'ts': time.time(),
+            'uptime_s': time.time() - self.start_time,
+            'cpu_pct': sample['cpu']['percent'],
+            'cpu_count': sample['cpu']['count'],
+            'cpu_freq_hz': round(cpu_freq * 1000000) if cpu_freq is not None else None,
+            'gpu_freq_hz': round(gpu_freq * 1000000) if gpu_freq is not None else None,
+            'temp_mC': round(cpu_temp * 1000) if cpu_temp is not None else None,
+            'mem_used_bytes': sample['memory']['used_bytes'],
+            'mem_total_bytes': sample['memory']['total_bytes'],
+            'disk_used_bytes': sample['disk']['used_bytes'],
+            'disk_total_bytes': sample['disk']['total_bytes'],
+        })
+    
+    def print_json(self):
+        """Emit current statistics as an NDJSON record"""
+        sys.stdout.write(self.format_json() + '\n')
+        sys.stdout.flush()
+    
+    def print_stats(self):
+        """Print current statistics"""
+        # One write for the whole block instead of a print() per line
+        sys.stdout.write('\n'.join(self.format_stats()) + '\n')
+        sys.stdout.flush()
     
-    def start_monitoring(self):
-        """Start performance monitoring"""
+    def redraw_stats(self):
+        """Repaint only the stats lines that changed since the last refresh"""
+        lines = self.format_stats()
+        prev = self._last_lines
+        row = self._stats_row
+        
+        # PERFORMANCE OPTIMIZATION: Cursor-address each changed line and
+        # send the whole update as a single write
+        out = []
+        for i, line in enumerate(lines):
+            if i >= len(prev) or line != prev[i]:
+                out.append(f"\x1b[{row + i};1H{line}\x1b[K")
+        if len(lines) < len(prev):
+            # Fewer lines than last time (e.g. a warning cleared)
+            out.append(f"\x1b[{row + len(lines)};1H\x1b[J")
+        if out:
+            # Park the cursor below the stats for any later output
+            out.append(f"\x1b[{row + len(lines)};1H")
+            sys.stdout.write(''.join(out))
+            sys.stdout.flush()
+        
+        self._last_lines = lines
+    
+    def start_monitoring(self, json_output=False):
+        """Start performance monitoring (NDJSON records instead of the screen if json_output)"""
         self.running = True
-        self.print_header()
+        if json_output:
+            refresh = self.print_json
+        else:
+            self.print_header()
+            refresh = self.redraw_stats
         
+        # PERFORMANCE OPTIMIZATION: Wait on a wakeup pipe instead of sleeping,
+        # so a signal or stop_monitoring() ends the wait at once rather than
+        # at the next tick
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_w, False)
         try:
+            prev_wakeup_fd = signal.set_wakeup_fd(self._wake_w)
+        except ValueError:
+            # Not on the main thread: only stop_monitoring() can wake us
+            prev_wakeup_fd = None
+        
+        try:
+            # PERFORMANCE OPTIMIZATION: Schedule against a monotonic deadline
+            # so refreshes land every interval instead of interval + work
+            deadline = time.monotonic()
             while self.running:
-                self.print_stats()
-                time.sleep(self.interval)
+                refresh()
+                deadline += self.interval
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    # Fell behind (system saturated): skip ahead, don't burst
+                    deadline = time.monotonic()
+                    timeout = 0
+                ready, _, _ = select.select([self._wake_r], [], [], timeout)
+                if ready:
+                    # Drain; self.running decides whether this was a stop
+                    os.read(self._wake_r, 512)
                 
         except KeyboardInterrupt:
             print("\n\n⏹️  Monitoring stopped by user")
             self.running = False
+        finally:
+            if prev_wakeup_fd is not None:
+                signal.set_wakeup_fd(prev_wakeup_fd)
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+            self._wake_r = self._wake_w = None
+            self.close()
     
     def stop_monitoring(self):
         """Stop performance monitoring"""
         self.running = False
+        if self._wake_w is not None:
+            try:
+                os.write(self._wake_w, b'\0')
+            except OSError:
+                pass  # Pipe full: the loop is already awake
+    
+    def close(self):
+        """Release the sysfs and /proc file descriptors and the vcgencmd shell"""
+        for name in ('_temp_fd', '_cpu_freq_fd', '_core_clk_fd', '_stat_fd', '_meminfo_fd'):
+            fd = getattr(self, name)
+            if fd is not None:
+                os.close(fd)
+                setattr(self, name, None)
+        _close_vcgencmd()
 
 def signal_handler(sig, frame):
     """Handle Ctrl+C gracefully"""
@@ -168,6 +500,8 @@ def main():
                        help="Update interval in seconds (default: 2.0)")
     parser.add_argument("--summary", action="store_true",
                        help="Show one-time summary instead of continuous monitoring")
+    parser.add_argument("--json", action="store_true",
+                       help="Emit one JSON record per update (NDJSON) with raw values")
     
     args = parser.parse_args()
     
@@ -177,14 +511,20 @@ def main():
     # Create monitor
     monitor = PerformanceMonitor(args.interval)
     
-    if args.summary:
+    if args.summary and args.json:
+        monitor.print_json()
+    elif args.summary:
         # Show one-time summary
         monitor.print_header()
         monitor.print_stats()
         print("\n📊 Summary complete")
     else:
-        # Start continuous monitoring
-        monitor.start_monitoring()
+        # Start continuous monitoring; Ctrl+C ends the wait through the
+        # wakeup pipe and the loop exits cleanly between redraws
+        signal.signal(signal.SIGINT, lambda sig, frame: monitor.stop_monitoring())
+        monitor.start_monitoring(json_output=args.json)
+        print("\nShutting down performance monitor...",
+              file=sys.stderr if args.json else sys.stdout)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
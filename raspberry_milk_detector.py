@@ -9,6 +9,8 @@ import cv2
 import numpy as np
 import time
 import threading
+import queue
+from collections import OrderedDict, namedtuple
 from pathlib import Path
 import argparse
 import signal
@@ -29,8 +31,241 @@ except ImportError:
         print("Error: Neither tflite-runtime nor tensorflow is available")
         sys.exit(1)
 
+# PERFORMANCE OPTIMIZATION: Resize and colour-convert through OpenCL (T-API)
+# when available, leaving the CPU cores to the TFLite threads; boards
+# without it keep the CPU path
+USE_OPENCL = cv2.ocl.haveOpenCL()
+if USE_OPENCL:
+    cv2.ocl.setUseOpenCL(True)
+
+# PERFORMANCE OPTIMIZATION: With numba installed, the BGR->RGB swap and the
+# float normalize run as one multi-threaded pass; without it preprocessing
+# uses the OpenCV/NumPy steps
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _bgr_to_normalized_rgb(src, dst):
+        """dst = src[..., ::-1] / 255 for a uint8 BGR image and float32 dst"""
+        scale = np.float32(1.0 / 255.0)
+        for y in prange(src.shape[0]):
+            for x in range(src.shape[1]):
+                dst[y, x, 0] = src[y, x, 2] * scale
+                dst[y, x, 1] = src[y, x, 1] * scale
+                dst[y, x, 2] = src[y, x, 0] * scale
+    
+    @njit(cache=True, nogil=True)
+    def _top_candidates(scores, threshold, out):
+        """
+        Indices of the len(out) highest scores >= threshold, best first,
+        written to out in one pass; returns how many were found
+        """
+        k = out.shape[0]
+        n = 0
+        for i in range(scores.shape[0]):
+            score = scores[i]
+            if score < threshold or (n == k and score <= scores[out[k - 1]]):
+                continue
+            # Insertion into the short sorted list, dropping the worst when full
+            j = n if n < k else k - 1
+            while j > 0 and scores[out[j - 1]] < score:
+                out[j] = out[j - 1]
+                j -= 1
+            out[j] = i
+            if n < k:
+                n += 1
+        return n
+else:
+    _bgr_to_normalized_rgb = None
+    _top_candidates = None
+
+# Most detections reported per frame: only this many top-scoring candidates reach NMS
+MAX_DETECTIONS = 10
+
+# Result frames owned by the detection pipeline: one being drawn, one
+# waiting for display, one on display
+DRAW_BUFFERS = 3
+
+# Rendered detection labels kept by draw_detections (LRU)
+LABEL_CACHE_SIZE = 256
+
+# USB (unprogrammed / programmed) vendor:product ids of the Coral accelerator
+CORAL_USB_IDS = {('1a6e', '089a'), ('18d1', '9302')}
+
+def _coral_present():
+    """True if a Coral Edge TPU is attached (PCIe/M.2 apex device or USB accelerator)"""
+    if os.path.exists('/dev/apex_0'):
+        return True
+    for device in Path('/sys/bus/usb/devices').glob('*'):
+        try:
+            ids = ((device / 'idVendor').read_text().strip(),
+                   (device / 'idProduct').read_text().strip())
+        except OSError:
+            continue
+        if ids in CORAL_USB_IDS:
+            return True
+    return False
+
+def _load_edgetpu_delegate():
+    """Edge TPU delegate, or None without an attached Coral or its runtime library"""
+    if not _coral_present():
+        return None
+    load_delegate = getattr(tflite, 'load_delegate', None)  # tflite-runtime
+    if load_delegate is None:
+        load_delegate = tflite.experimental.load_delegate    # tensorflow
+    try:
+        return load_delegate('libedgetpu.so.1')
+    except (ValueError, OSError):
+        return None
+
+# Model files looked for by resolve_model_path, fastest first (names as
+# exported by Ultralytics / compiled by edgetpu_compiler)
+EDGETPU_MODELS = ("model/best_full_integer_quant_edgetpu.tflite", "model/best_int8_edgetpu.tflite")
+INT8_MODELS = ("model/best_int8.tflite", "model/best_full_integer_quant.tflite")
+FLOAT_MODEL = "model/best_float32.tflite"
+
+def resolve_model_path(quantized=False):
+    """
+    Pick the fastest model available for this machine
+    
+    An Edge TPU-compiled model when a Coral is attached, then (if
+    quantized) an int8 model for the CPU's integer kernels, then the
+    float32 model. Returns the first that exists, or FLOAT_MODEL.
+    """
+    candidates = []
+    if _coral_present():
+        candidates += EDGETPU_MODELS
+    if quantized:
+        candidates += INT8_MODELS
+    for path in candidates:
+        if os.path.exists(path):
+            return path
+    return FLOAT_MODEL
+
+def _pin_current_thread(cpus):
+    """Restrict the calling thread to the given CPU set (Linux only); True on success"""
+    if not cpus or not hasattr(os, 'sched_setaffinity'):
+        return False
+    try:
+        os.sched_setaffinity(0, cpus)
+        return True
+    except OSError:
+        return False
+
+class FrameGrabber:
+    """
+    Capture frames on a background thread, keeping only the newest one
+    
+    PERFORMANCE OPTIMIZATION: The camera fills the next frame while the
+    main thread runs inference on the current one. The 1-slot queue drops
+    stale frames so processing never falls behind the camera.
+    """
+    
+    def __init__(self, read_frame, cpus=None, name="frame-grabber", discard=None):
+        """
+        Args:
+            read_frame: Callable returning the next frame, or None when the source fails
+            cpus: Optional CPU set to pin the thread to
+            name: Thread name, also used in error messages
+            discard: Optional callable given each frame dropped unread for a newer one
+        """
+        self._read_frame = read_frame
+        self._cpus = cpus
+        self._discard = discard
+        self._queue = queue.Queue(maxsize=1)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+    
+    def start(self):
+        self._thread.start()
+        return self
+    
+    def _put_latest(self, frame):
+        """Replace whatever frame is waiting with this one"""
+        try:
+            self._queue.put_nowait(frame)
+        except queue.Full:
+            try:
+                stale = self._queue.get_nowait()
+                if self._discard is not None and stale is not None:
+                    self._discard(stale)
+            except queue.Empty:
+                pass
+            self._queue.put_nowait(frame)
+    
+    def _run(self):
+        _pin_current_thread(self._cpus)
+        try:
+            while not self._stop.is_set():
+                frame = self._read_frame()
+                self._put_latest(frame)
+                if frame is None:
+                    return
+        except Exception as e:
+            print(f"Error in {self._thread.name}: {e}")
+            self._put_latest(None)
+    
+    def read(self, timeout=None):
+        """
+        Newest frame, waiting for one if needed; None once the source has failed
+        
+        Raises queue.Empty if timeout (seconds) passes without a frame.
+        """
+        return self._queue.get(timeout=timeout)
+    
+    def stop(self, timeout=2.0):
+        """Stop capturing; returns once the thread is no longer using the camera"""
+        self._stop.set()
+        self._thread.join(timeout)
+
+class FrameWriter:
+    """
+    Save frames as JPEG on a background thread
+    
+    PERFORMANCE OPTIMIZATION: Encoding and writing a snapshot takes tens of
+    milliseconds at higher resolutions; doing it here keeps the detection
+    loop from dropping frames. Saves beyond the queue's capacity are dropped.
+    """
+    
+    def __init__(self, max_pending=4, jpeg_quality=85):
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+        self._thread = threading.Thread(target=self._run, name="frame-writer", daemon=True)
+    
+    def start(self):
+        self._thread.start()
+        return self
+    
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            filename, frame = item
+            if cv2.imwrite(filename, frame, self._params):
+                print(f"Frame saved: {filename}")
+            else:
+                print(f"Error: Could not save frame {filename}")
+    
+    def save(self, filename, frame):
+        """Queue a copy of frame for writing; False if too many saves are pending"""
+        try:
+            self._queue.put_nowait((str(filename), frame.copy()))
+            return True
+        except queue.Full:
+            print(f"Save queue full, frame not saved: {filename}")
+            return False
+    
+    def stop(self, timeout=5.0):
+        """Finish the queued saves and stop the writer thread"""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
 class RaspberryMilkDetector:
-    def __init__(self, model_path, confidence_threshold=0.5, nms_threshold=0.4):
+    def __init__(self, model_path, confidence_threshold=0.5, nms_threshold=0.4, inference_threads=None):
         """
         Initialize the Raspberry Pi milk packet detector
         
@@ -38,6 +273,7 @@ class RaspberryMilkDetector:
             model_path: Path to the TFLite model
             confidence_threshold: Minimum confidence for detection
             nms_threshold: Non-maximum suppression threshold
+            inference_threads: TFLite thread count (default: one per inference core)
         """
         self.confidence_threshold = confidence_threshold
         self.nms_threshold = nms_threshold
@@ -54,42 +290,77 @@ class RaspberryMilkDetector:
         self.production_line_mode = False
         
         # Speed detection parameters
-        self.speed_detection_frames = []
+        # PERFORMANCE OPTIMIZATION: Recent detection centers live in one
+        # preallocated array of (timestamp, center_x, center_y) rows, the
+        # live window being rows [_speed_head:_speed_tail]
+        self._speed_buf = np.empty((1024, 3), dtype=np.float64)
+        self._speed_head = 0
+        self._speed_tail = 0
         self.speed_detection_timestamps = []
         self.last_detection_positions = []
         self.conveyor_width = 0.5  # meters (adjustable)
         self.pixel_to_meter_ratio = 1.0  # pixels per meter
         
-        # Load TFLite model
-        self.interpreter = tflite.Interpreter(model_path=model_path)
-        
-        # PERFORMANCE OPTIMIZATION: Configure interpreter for Pi 4
-        try:
-            # Set number of threads for better performance on Pi 4
-            self.interpreter.set_num_threads(4)
-            print("Set TFLite interpreter to use 4 threads")
-        except:
-            print("Could not set thread count (using default)")
+        # Speeds typed at the 'v' prompt, read on a helper thread so the
+        # camera loop never waits on stdin
+        self._speed_entries = queue.Queue()
+        self._speed_prompt = None
+        
+        # PERFORMANCE OPTIMIZATION: On 4+ cores, keep the first core for the
+        # camera capture thread and run inference on the rest. This thread is
+        # pinned only while the interpreter is built, so the worker threads
+        # TFLite starts there inherit the inference affinity; its previous
+        # mask is restored right after. The detection thread pins itself.
+        cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else []
+        if len(cpus) >= 4 and _pin_current_thread(set(cpus[1:])):
+            self.capture_cpus = {cpus[0]}
+            self.inference_cpus = set(cpus[1:])
+            print(f"Capture pinned to CPU {cpus[0]}, inference to CPUs {cpus[1:]}")
+        else:
+            self.capture_cpus = self.inference_cpus = None
+        inference_cores = len(cpus) - 1 if self.capture_cpus else (len(cpus) or os.cpu_count() or 1)
+        self.inference_threads = inference_threads or inference_cores
+        
+        # PERFORMANCE OPTIMIZATION: Use a Coral Edge TPU when one is attached.
+        # The delegate is resolved before the interpreter is built, so only
+        # one interpreter (and tensor arena) is ever created.
+        edgetpu_delegate = _load_edgetpu_delegate()
+        delegates = [edgetpu_delegate] if edgetpu_delegate is not None else []
+        if delegates:
+            print("Coral Edge TPU acceleration enabled")
+            if '_edgetpu' not in Path(model_path).stem:
+                print("  Note: model is not Edge TPU-compiled; it will still run on the CPU")
+        else:
+            print("Edge TPU not available, using CPU")
         
-        # PERFORMANCE OPTIMIZATION: Enable GPU delegation if available
+        # Load TFLite model
+        # PERFORMANCE OPTIMIZATION: Configure interpreter threads for Pi 4
+        # (the thread count is a constructor argument; the Interpreter has no
+        # set_num_threads method)
         try:
-            # Try to enable GPU acceleration
-            from tflite_runtime.interpreter import load_delegate
-            gpu_delegate = load_delegate('libedgetpu.so.1.0')
             self.interpreter = tflite.Interpreter(
                 model_path=model_path,
-                experimental_delegates=[gpu_delegate]
+                experimental_delegates=delegates or None,
+                num_threads=self.inference_threads
             )
-            print("GPU acceleration enabled")
-        except:
-            print("GPU acceleration not available, using CPU")
-        
-        self.interpreter.allocate_tensors()
+            print(f"Set TFLite interpreter to use {self.inference_threads} threads")
+            
+            self.interpreter.allocate_tensors()
+        finally:
+            if self.inference_cpus:
+                _pin_current_thread(set(cpus))
         
         # Get model details
         self.input_details = self.interpreter.get_input_details()
         self.output_details = self.interpreter.get_output_details()
         
+        # PERFORMANCE OPTIMIZATION: Zero-copy accessors for the interpreter's
+        # own input/output buffers, instead of set_tensor/get_tensor copies.
+        # The views they return must be released before the next invoke().
+        self._input_idx = self.input_details[0]['index']
+        self._input_tensor_fn = self.interpreter.tensor(self._input_idx)
+        self._output_tensor_fn = self.interpreter.tensor(self.output_details[0]['index'])
+        
         # Get input shape
         self.input_shape = self.input_details[0]['shape']
         self.input_height = self.input_shape[1]
@@ -99,187 +370,284 @@ class RaspberryMilkDetector:
         print(f"Input shape: {self.input_shape}")
         print(f"Input size: {self.input_width}x{self.input_height}")
         
+        # PERFORMANCE OPTIMIZATION: Feed fully-quantized (uint8/int8) models
+        # pixels in their native type instead of float32 that TFLite would
+        # only requantize
+        self._input_dtype = np.dtype(self.input_details[0]['dtype'])
+        self._input_quant = self.input_details[0].get('quantization', (0.0, 0))
+        self._output_quant = self.output_details[0].get('quantization', (0.0, 0))
+        if self._input_dtype in (np.uint8, np.int8):
+            print(f"Quantized model input ({self._input_dtype}), skipping float normalization")
+        
+        # PERFORMANCE OPTIMIZATION: Preprocessing buffers allocated once and
+        # reused every frame (resize/convert/normalize write into them in place)
+        self._rgb_u8 = np.empty((self.input_height, self.input_width, 3), dtype=np.uint8)
+        self._input_tensor = np.empty((1, self.input_height, self.input_width, 3), dtype=self._input_dtype)
+        
+        # Swap and normalize in one compiled pass for float models (compiled
+        # here rather than stalling the first frame)
+        self._fused_normalize = _bgr_to_normalized_rgb is not None and self._input_dtype == np.float32
+        if self._fused_normalize:
+            _bgr_to_normalized_rgb(self._rgb_u8, self._input_tensor[0])
+        
+        # PERFORMANCE OPTIMIZATION: Scratch space for candidate box math in
+        # detect(), sized for every anchor so no frame allocates temporaries
+        num_anchors = int(self.output_details[0]['shape'][-1])
+        self._cand_buf = np.empty(4 * num_anchors, dtype=np.float32)
+        self._xyxy_buf = np.empty(4 * num_anchors, dtype=np.float32)
+        self._nms_boxes = np.empty((num_anchors, 4), dtype=np.float32)
+        self._top_idx = np.empty(MAX_DETECTIONS, dtype=np.intp)
+        if _top_candidates is not None:
+            # Compile now rather than on the first frame
+            _top_candidates(np.zeros(num_anchors, dtype=np.float32), 1.0, self._top_idx)
+        
+        # Display frame that detections are drawn onto, sized on first use
+        self._draw_buf = None
+        
+        # Preview window refresh cap (see display_due); with display_enabled
+        # off no window is opened at all
+        self.display_enabled = True
+        self.display_fps = 15
+        self._last_display_time = 0.0
+        
+        # PERFORMANCE OPTIMIZATION: Detection labels are rasterized once and
+        # copied in from this cache afterwards
+        self._label_cache = OrderedDict()
+        
         # PERFORMANCE OPTIMIZATION: Add frame skip counter
         self.frame_skip_counter = 0
         self.frame_skip_interval = 1  # Process every frame by default
+        self.inference_count = 0  # Frames that actually ran detect()
         
-    def preprocess_image(self, image):
+    def preprocess_image(self, image, out=None, model_rgb=None):
         """
         Preprocess image for model input (optimized for Pi)
         
         Args:
             image: Input image (numpy array)
+            out: (1, H, W, 3) array to write into; defaults to a persistent buffer
+            model_rgb: Optional RGB uint8 image already at model input size
+                (e.g. the camera's lores stream); used instead of image
             
         Returns:
-            Preprocessed image
+            Preprocessed image (out, or the persistent buffer overwritten on the next call)
         """
-        # Resize image to model input size
-        resized = cv2.resize(image, (self.input_width, self.input_height))
-        
-        # Convert to RGB if needed
-        if len(resized.shape) == 3 and resized.shape[2] == 3:
-            resized = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
-        
-        # Normalize to [0, 1]
-        normalized = resized.astype(np.float32) / 255.0
-        
-        # Add batch dimension
-        input_tensor = np.expand_dims(normalized, axis=0)
+        tensor = self._input_tensor if out is None else out
+        rgb = self._rgb_u8
+        if model_rgb is not None:
+            # Camera already delivered model-sized RGB: no resize or conversion
+            rgb = model_rgb
+        elif image.shape[:2] == rgb.shape[:2]:
+            # PERFORMANCE OPTIMIZATION: Frame already at model input size -
+            # skip the resize, the conversion below is the only pass
+            if self._fused_normalize:
+                _bgr_to_normalized_rgb(image, tensor[0])
+                return tensor
+            cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=rgb)
+        elif USE_OPENCL:
+            # Resize and convert on the device, downloading the result once
+            resized = cv2.resize(cv2.UMat(image), (self.input_width, self.input_height),
+                                 interpolation=self._resize_interpolation(image.shape))
+            rgb = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB).get()
+        else:
+            # Resize image to model input size, then convert BGR to RGB in place
+            cv2.resize(image, (self.input_width, self.input_height), dst=rgb,
+                       interpolation=self._resize_interpolation(image.shape))
+            if self._fused_normalize:
+                # Still BGR: swap and normalize together
+                _bgr_to_normalized_rgb(rgb, tensor[0])
+                return tensor
+            cv2.cvtColor(rgb, cv2.COLOR_BGR2RGB, dst=rgb)
+        
+        dst = tensor[0]
+        if self._input_dtype == np.float32:
+            # Normalize to [0, 1] straight into the batch-of-one input tensor
+            np.multiply(rgb, np.float32(1 / 255.0), out=dst)
+            return tensor
+        
+        # Quantized input: the usual export maps [0, 1] to scale=1/255 with
+        # zero_point 0 (uint8) or -128 (int8), i.e. raw pixels, shifted for int8
+        scale, zero_point = self._input_quant
+        if scale and abs(scale * 255.0 - 1.0) < 1e-3:
+            if self._input_dtype == np.uint8 and zero_point == 0:
+                dst[...] = rgb
+                return tensor
+            if self._input_dtype == np.int8 and zero_point == -128:
+                # x - 128 == flipping the top bit, then reading back as int8
+                np.bitwise_xor(rgb, 0x80, out=dst.view(np.uint8))
+                return tensor
+        
+        # Any other quantization: q = x / 255 / scale + zero_point
+        info = np.iinfo(self._input_dtype)
+        q = np.rint(rgb * np.float32(1 / (255.0 * scale)) + zero_point)
+        np.clip(q, info.min, info.max, out=q)
+        dst[...] = q
+        return tensor
+    
+    def _resize_interpolation(self, shape):
+        """
+        Interpolation for resizing a frame of this shape to the model input
         
-        return input_tensor
+        Nearest-neighbour on a fast conveyor (> 2 m/s) where throughput
+        matters most, area averaging when shrinking in both directions,
+        bilinear otherwise.
+        """
+        if self.conveyor_speed > 2.0:
+            return cv2.INTER_NEAREST
+        if shape[0] >= self.input_height and shape[1] >= self.input_width:
+            return cv2.INTER_AREA
+        return cv2.INTER_LINEAR
     
-    def detect(self, image):
+    def detect(self, image, model_rgb=None):
         """
         Run detection on the image (optimized for real-time)
         
         Args:
-            image: Input image (numpy array)
+            image: Input image (numpy array); boxes are scaled to its size
+            model_rgb: Optional model-sized RGB copy of image, see preprocess_image
             
         Returns:
-            List of detections with format [x1, y1, x2, y2, confidence, class_id]
+            (N, 6) float32 array of detections, rows [x1, y1, x2, y2, confidence, class_id],
+            most confident first
         """
         # PERFORMANCE OPTIMIZATION: Skip detection if frame skip is active
-        if hasattr(self, 'frame_skip_interval') and self.frame_skip_interval > 1:
-            if self.frame_count % self.frame_skip_interval != 0:
-                if hasattr(self, 'last_detections'):
-                    return self.last_detections
+        frame_skip_interval = self.frame_skip_interval
+        if frame_skip_interval > 1 and self.frame_count % frame_skip_interval != 0:
+            if hasattr(self, 'last_detections'):
+                return self.last_detections
         
-        # Preprocess image
-        input_tensor = self.preprocess_image(image)
-        
-        # Set input tensor
-        self.interpreter.set_tensor(self.input_details[0]['index'], input_tensor)
+        # Preprocess image straight into the interpreter's input tensor
+        input_view = self._input_tensor_fn()
+        self.preprocess_image(image, out=input_view, model_rgb=model_rgb)
+        del input_view  # invoke() refuses to run while views are held
         
         # Run inference
         self.interpreter.invoke()
         
-        # Get output tensor (YOLO format: [1, 5, 8400])
-        output = self.interpreter.get_tensor(self.output_details[0]['index'])[0]  # Shape: [5, 8400]
+        # Get output tensor (YOLO format: [1, 5, 8400]), a view that is only
+        # used within this call
+        output = self._output_tensor_fn()[0]  # Shape: [5, 8400]
+        
+        # Dequantize integer outputs so coordinates/confidences are in [0, 1]
+        out_scale, out_zero_point = self._output_quant
+        if out_scale and output.dtype != np.float32:
+            output = (output.astype(np.float32) - out_zero_point) * out_scale
         
         # PERFORMANCE OPTIMIZATION: Faster detection parsing
-        valid_detections = []
-        
-        # Use numpy operations for faster processing
-        confidences = output[4, :]
-        valid_indices = np.where(confidences >= self.confidence_threshold)[0]
-        
-        if len(valid_indices) > 0:
-            # Get coordinates for valid detections only
-            x_centers = output[0, valid_indices]
-            y_centers = output[1, valid_indices]
-            widths = output[2, valid_indices]
-            heights = output[3, valid_indices]
+        valid_detections = np.empty((0, 6), dtype=np.float32)
+        
+        # Use numpy operations for faster processing; the confidence row is
+        # contiguous in the (5, 8400) layout, so the comparison runs on the view
+        confidences = output[4]
+        
+        # PERFORMANCE OPTIMIZATION: NMS only ever looks at the most confident
+        # MAX_DETECTIONS candidates (top_k below), so pick those in O(N)
+        # before any box math; matters when a low threshold lets hundreds through
+        if _top_candidates is not None:
+            # Threshold and top-k in one compiled pass that releases the GIL
+            n = _top_candidates(confidences, self.confidence_threshold, self._top_idx)
+            valid_indices = self._top_idx[:n]
+        else:
+            valid_indices = np.flatnonzero(confidences >= self.confidence_threshold)
+            if len(valid_indices) > MAX_DETECTIONS:
+                top = np.argpartition(-confidences[valid_indices], MAX_DETECTIONS)[:MAX_DETECTIONS]
+                valid_indices = valid_indices[top]
+        
+        n = len(valid_indices)
+        if n > 0:
+            # Get coordinates for valid detections only, in one gather into
+            # the preallocated scratch rows [x_center, y_center, width, height]
+            cand = self._cand_buf[:4 * n].reshape(4, n)
+            np.take(output[:4], valid_indices, axis=1, out=cand)
             valid_confidences = confidences[valid_indices]
             
-            # Convert to pixel coordinates (vectorized)
-            x1 = np.clip((x_centers - widths/2) * image.shape[1], 0, image.shape[1])
-            y1 = np.clip((y_centers - heights/2) * image.shape[0], 0, image.shape[0])
-            x2 = np.clip((x_centers + widths/2) * image.shape[1], 0, image.shape[1])
-            y2 = np.clip((y_centers + heights/2) * image.shape[0], 0, image.shape[0])
+            # PERFORMANCE OPTIMIZATION: Convert to clipped pixel coordinates
+            # in place ([x1, y1, x2, y2] rows) instead of a temporary per step
+            height, width = image.shape[:2]
+            scale = np.array([[width], [height], [width], [height]], dtype=np.float32)
+            xyxy = self._xyxy_buf[:4 * n].reshape(4, n)
+            np.multiply(cand[2:], 0.5, out=cand[2:])
+            np.subtract(cand[:2], cand[2:], out=xyxy[:2])
+            np.add(cand[:2], cand[2:], out=xyxy[2:])
+            np.multiply(xyxy, scale, out=xyxy)
+            np.clip(xyxy, 0, scale, out=xyxy)
             
-            # Convert to integers and create detection list
-            for i in range(len(valid_indices)):
-                valid_detections.append([
-                    int(x1[i]), int(y1[i]), int(x2[i]), int(y2[i]), 
-                    float(valid_confidences[i]), 0
-                ])
-        
-        # PERFORMANCE OPTIMIZATION: Limit maximum detections
-        if len(valid_detections) > 10:
-            # Sort by confidence and keep top 10
-            valid_detections = sorted(valid_detections, key=lambda x: x[4], reverse=True)[:10]
-        
-        # Apply non-maximum suppression only if needed
-        if len(valid_detections) > 1:
-            valid_detections = self.non_max_suppression(valid_detections)
+            # PERFORMANCE OPTIMIZATION: NMS in OpenCV's compiled code instead
+            # of a Python loop; top_k keeps only the most confident boxes
+            boxes = self._nms_boxes[:n]
+            boxes[:, :2] = xyxy[:2].T
+            np.subtract(xyxy[2:].T, xyxy[:2].T, out=boxes[:, 2:])
+            keep = cv2.dnn.NMSBoxes(boxes, valid_confidences, self.confidence_threshold,
+                                    self.nms_threshold, top_k=MAX_DETECTIONS)
+            
+            # PERFORMANCE OPTIMIZATION: Assemble the kept rows as one array
+            # instead of a Python list per detection
+            keep = np.asarray(keep, dtype=np.intp).reshape(-1)
+            valid_detections = np.empty((len(keep), 6), dtype=np.float32)
+            valid_detections[:, :4] = xyxy[:, keep].T
+            valid_detections[:, 4] = valid_confidences[keep]
+            valid_detections[:, 5] = 0  # single class: milk packet
         
         # Store for frame skipping
         self.last_detections = valid_detections
         
         return valid_detections
     
-    def non_max_suppression(self, detections):
-        """
-        Apply non-maximum suppression to remove overlapping detections
-        """
-        if not detections:
-            return []
-        
-        # Sort by confidence
-        detections = sorted(detections, key=lambda x: x[4], reverse=True)
-        
-        filtered_detections = []
-        
-        while detections:
-            # Take the detection with highest confidence
-            current = detections.pop(0)
-            filtered_detections.append(current)
-            
-            # Remove overlapping detections
-            remaining = []
-            for detection in detections:
-                iou = self.calculate_iou(current, detection)
-                if iou < self.nms_threshold:
-                    remaining.append(detection)
-            
-            detections = remaining
-        
-        return filtered_detections
-    
-    def calculate_iou(self, box1, box2):
-        """
-        Calculate Intersection over Union between two bounding boxes
-        """
-        x1_1, y1_1, x2_1, y2_1 = box1[:4]
-        x1_2, y1_2, x2_2, y2_2 = box2[:4]
-        
-        # Calculate intersection
-        x1_i = max(x1_1, x1_2)
-        y1_i = max(y1_1, y2_2)
-        x2_i = min(x2_1, x2_2)
-        y2_i = min(y2_1, y2_2)
-        
-        if x2_i <= x1_i or y2_i <= y1_i:
-            return 0.0
-        
-        intersection = (x2_i - x1_i) * (y2_i - y1_i)
-        
-        # Calculate union
-        area1 = (x2_1 - x1_1) * (y2_1 - y1_1)
-        area2 = (x2_2 - x1_2) * (y2_2 - y1_2)
-        union = area1 + area2 - intersection
-        
-        return intersection / union if union > 0 else 0.0
-    
     def draw_detections(self, image, detections):
         """
         Draw detection boxes and labels on the image (optimized for Pi)
         """
+        # Integer pixel corners for all boxes in one conversion
+        boxes = detections[:, :4].astype(np.int32).tolist()
+        confidences = detections[:, 4].tolist()
+        
         # Draw bounding boxes and labels
-        for i, detection in enumerate(detections):
-            x1, y1, x2, y2, confidence, class_id = detection
+        for i, ((x1, y1, x2, y2), confidence) in enumerate(zip(boxes, confidences)):
             
             # Draw bounding box
             cv2.rectangle(image, (x1, y1), (x2, y2), (0, 255, 0), 2)
             
-            # Draw label
+            # Draw label (background and text) above the box
             label = f"Milk {i+1}: {confidence:.2f}"
-            label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)[0]
-            
-            # Position label above the box
+            patch = self._label_stamp(label)
             label_x = max(0, x1)
             label_y = max(0, y1 - 10)
             
-            # Draw label background
-            cv2.rectangle(image, (label_x, label_y - label_size[1] - 10), 
-                         (label_x + label_size[0], label_y), (0, 255, 0), -1)
-            
-            # Draw label text
-            cv2.putText(image, label, (label_x, label_y - 5), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
+            # Copy the box in with its bottom-left corner at (label_x, label_y),
+            # clipped at the top of the frame like the rectangle it replaces
+            top = label_y + 1 - patch.shape[0]
+            right = min(label_x + patch.shape[1], image.shape[1])
+            if label_y < image.shape[0] and right > label_x:
+                image[max(top, 0):label_y + 1, label_x:right] = \
+                    patch[max(-top, 0):, :right - label_x]
         
         return image
     
+    def _label_stamp(self, label):
+        """
+        Detection label box (green background, black text) rendered once and cached
+        
+        Returns the same pixels draw_detections used to produce with
+        cv2.rectangle + cv2.putText; the text baseline sits 5px above the
+        bottom edge and the box is placed by its bottom-left corner.
+        """
+        patch = self._label_cache.get(label)
+        if patch is not None:
+            self._label_cache.move_to_end(label)
+            return patch
+        
+        (text_width, text_height), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
+        # Same extent as the filled cv2.rectangle it replaces
+        patch = np.empty((text_height + 11, text_width + 1, 3), dtype=np.uint8)
+        patch[...] = (0, 255, 0)
+        cv2.putText(patch, label, (0, text_height + 5),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
+        
+        self._label_cache[label] = patch
+        if len(self._label_cache) > LABEL_CACHE_SIZE:
+            self._label_cache.popitem(last=False)
+        return patch
+    
     def set_frame_skip(self, interval):
         """
         Set frame skip interval for performance optimization
@@ -347,66 +715,88 @@ class RaspberryMilkDetector:
                 self.frame_skip_interval = 1
                 print(f"Low speed detected: Processing every frame")
     
+    def prompt_conveyor_speed(self):
+        """
+        Ask for the conveyor speed on stdin without blocking the caller
+        
+        The answer is applied by apply_entered_conveyor_speed() on the
+        detection loop's next iteration; repeated calls while a prompt is
+        open are ignored.
+        """
+        if self._speed_prompt is not None and self._speed_prompt.is_alive():
+            return
+        
+        def read_speed():
+            try:
+                self._speed_entries.put(float(input("Enter conveyor speed (m/s): ")))
+            except (ValueError, EOFError):
+                print("Invalid speed value")
+        
+        self._speed_prompt = threading.Thread(target=read_speed, name="speed-prompt", daemon=True)
+        self._speed_prompt.start()
+    
+    def apply_entered_conveyor_speed(self):
+        """Apply a speed entered at the prompt, if one has arrived"""
+        try:
+            speed = self._speed_entries.get_nowait()
+        except queue.Empty:
+            return
+        self.set_conveyor_speed(speed)
+    
     def detect_conveyor_speed(self, detections, frame_width, frame_height):
         """
         Automatically detect conveyor belt speed from object movement
         
         Args:
-            detections: List of detections from current frame
+            detections: (N, 6) detection array from current frame
             frame_width: Frame width in pixels
             frame_height: Frame height in pixels
         """
-        if not self.speed_detection_enabled or not detections:
+        if not self.speed_detection_enabled or len(detections) == 0:
             return
         
         current_time = time.time()
+        buf = self._speed_buf
+        n = len(detections)
+        
+        if self._speed_tail + n > len(buf):
+            # Out of room at the end: move the live rows to the front,
+            # dropping the oldest if the window alone would overflow
+            live = buf[self._speed_head:self._speed_tail]
+            keep = min(len(live), len(buf) - n)
+            buf[:keep] = live[len(live) - keep:]
+            self._speed_head, self._speed_tail = 0, keep
         
         # Store detection positions and timestamps
-        for detection in detections:
-            x1, y1, x2, y2, confidence, class_id = detection
-            center_x = (x1 + x2) / 2
-            center_y = (y1 + y2) / 2
-            
-            self.speed_detection_frames.append({
-                'timestamp': current_time,
-                'center_x': center_x,
-                'center_y': center_y,
-                'confidence': confidence
-            })
-        
-        # Keep only recent detections (last 5 seconds)
+        rows = buf[self._speed_tail:self._speed_tail + n]
+        rows[:, 0] = current_time
+        rows[:, 1] = (detections[:, 0] + detections[:, 2]) / 2
+        rows[:, 2] = (detections[:, 1] + detections[:, 3]) / 2
+        self._speed_tail += n
+        
+        # Keep only recent detections (last 5 seconds); rows are in time
+        # order, so the cutoff is a binary search and an index advance
         cutoff_time = current_time - 5.0
-        self.speed_detection_frames = [
-            f for f in self.speed_detection_frames 
-            if f['timestamp'] > cutoff_time
-        ]
+        self._speed_head += int(np.searchsorted(
+            buf[self._speed_head:self._speed_tail, 0], cutoff_time, side='right'))
+        recent = buf[self._speed_head:self._speed_tail]
         
         # Calculate speed if we have enough data
-        if len(self.speed_detection_frames) >= 3:
-            # Find objects moving horizontally (conveyor direction)
-            horizontal_movements = []
+        if len(recent) >= 3:
+            time_diff = np.diff(recent[:, 0])
+            x_diff = np.diff(recent[:, 1])
+            y_diff = np.diff(recent[:, 2])
             
-            for i in range(1, len(self.speed_detection_frames)):
-                prev_frame = self.speed_detection_frames[i-1]
-                curr_frame = self.speed_detection_frames[i]
-                
-                time_diff = curr_frame['timestamp'] - prev_frame['timestamp']
-                x_diff = curr_frame['center_x'] - prev_frame['center_x']
-                y_diff = curr_frame['center_y'] - prev_frame['center_y']
-                
-                # Only consider horizontal movement (conveyor direction)
-                if abs(x_diff) > abs(y_diff) and time_diff > 0:
-                    # Convert pixels to meters and calculate speed
-                    distance_m = abs(x_diff) / self.pixel_to_meter_ratio
-                    speed_mps = distance_m / time_diff
-                    
-                    if 0.01 < speed_mps < 10.0:  # Reasonable speed range
-                        horizontal_movements.append(speed_mps)
+            # Only consider horizontal movement (conveyor direction)
+            horizontal = (np.abs(x_diff) > np.abs(y_diff)) & (time_diff > 0)
+            
+            # Convert pixels to meters and calculate speed
+            speeds = np.abs(x_diff[horizontal]) / self.pixel_to_meter_ratio / time_diff[horizontal]
+            speeds = speeds[(speeds > 0.01) & (speeds < 10.0)]  # Reasonable speed range
             
-            if horizontal_movements:
+            if speeds.size:
                 # Calculate average speed
-                avg_speed = sum(horizontal_movements) / len(horizontal_movements)
-                self.conveyor_speed = avg_speed
+                self.conveyor_speed = float(speeds.mean())
                 
                 # Auto-adjust processing based on detected speed
                 if self.adaptive_processing:
@@ -481,6 +871,76 @@ class RaspberryMilkDetector:
             self.frame_skip_interval = 1
             print("Performance mode: Processing every frame")
     
+    def apply_performance_mode(self, mode, target_fps=15):
+        """
+        Apply a named performance mode: quality, balanced or speed
+        """
+        if mode == "speed":
+            self.optimize_for_performance(10)
+            print("Performance mode: SPEED (target: 10+ FPS)")
+        elif mode == "quality":
+            self.optimize_for_performance(30)
+            print("Performance mode: QUALITY (target: 30 FPS)")
+        else:  # balanced
+            self.optimize_for_performance(target_fps)
+            print("Performance mode: BALANCED")
+    
+    def run_benchmark(self, resolution=(640, 480), target_fps=15, mode="balanced", duration_s=10.0):
+        """
+        Measure processing throughput for one settings combination in-process
+        
+        Frames are synthetic (fixed noise at the given resolution), so the
+        loaded interpreter can be reused across runs and results compare
+        processing cost alone, independent of camera timing.
+        
+        The mode's frame skip stays on, so 'fps' is the rate frames are
+        delivered at. Skipped frames only return the cached result, so
+        'inference_ms' is timed over the frames that actually ran detect().
+        
+        Returns:
+            Dict with the settings, frames delivered, FPS, inferences run and
+            mean time per inference (ms)
+        """
+        self.apply_performance_mode(mode, target_fps)
+        
+        width, height = resolution
+        frame = np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+        
+        # Reset per-run state so earlier runs don't leak cached results
+        self.frame_count = 0
+        self.last_time = time.time()
+        for attr in ('last_detections', 'last_result_frame'):
+            if hasattr(self, attr):
+                delattr(self, attr)
+        
+        frames = 0
+        inferences = 0
+        inference_time = 0.0
+        start = time.perf_counter()
+        end = start + duration_s
+        now = start
+        while now < end:
+            ran = self.inference_count
+            self.process_frame(frame)
+            self.calculate_fps()
+            frames += 1
+            done = time.perf_counter()
+            if self.inference_count != ran:
+                inferences += 1
+                inference_time += done - now
+            now = done
+        elapsed = now - start
+        
+        return {
+            'resolution': f"{width}x{height}",
+            'fps_target': target_fps,
+            'mode': mode,
+            'frames': frames,
+            'fps': frames / elapsed,
+            'inferences': inferences,
+            'inference_ms': 1000.0 * inference_time / max(1, inferences),
+        }
+    
     def calculate_fps(self):
         """Calculate and update FPS"""
         self.frame_count += 1
@@ -491,9 +951,14 @@ class RaspberryMilkDetector:
             self.frame_count = 0
             self.last_time = current_time
     
-    def process_frame(self, frame):
+    def process_frame(self, frame, model_rgb=None, out=None):
         """
         Process a single frame and return detection results (optimized for low lag)
+        
+        model_rgb is an optional model-sized RGB copy of frame, see preprocess_image.
+        out is an optional frame-sized buffer to draw the result into instead of
+        the detector's own; on skipped frames the cached result is returned and
+        out is left untouched.
         """
         # PERFORMANCE OPTIMIZATION: Smart frame skipping for minimal lag
         self.frame_skip_counter += 1
@@ -503,12 +968,12 @@ class RaspberryMilkDetector:
             if self.frame_count % self.frame_skip_interval != 0:
                 # Return cached result with minimal processing
                 if hasattr(self, 'last_detections') and hasattr(self, 'last_result_frame'):
-                    # Just update FPS counter and return cached frame
-                    self.calculate_fps()
+                    # Return cached frame; the caller updates the FPS counter
                     return self.last_result_frame, self.last_detections
         
         # Run detection (only when needed)
-        detections = self.detect(frame)
+        detections = self.detect(frame, model_rgb)
+        self.inference_count += 1
         
         # CONVEYOR BELT SYNCHRONIZATION: Detect speed from object movement
         if self.production_line_mode and self.speed_detection_enabled:
@@ -517,43 +982,64 @@ class RaspberryMilkDetector:
         # Store detections for frame skipping
         self.last_detections = detections
         
-        # PERFORMANCE OPTIMIZATION: Only draw detections when displaying
-        if self.frame_count % 2 == 0:  # Update display every 2nd frame
-            result_frame = self.draw_detections(frame.copy(), detections)
-            self.last_result_frame = result_frame
-        else:
-            # Use cached frame for non-display frames
-            if hasattr(self, 'last_result_frame'):
-                result_frame = self.last_result_frame
-            else:
-                result_frame = frame.copy()
+        # Draw once per processed frame; skipped frames reuse this result
+        # above, so the boxes always match the frame they were found on
+        result_frame = self.draw_detections(self._copy_for_drawing(frame, out), detections)
         
         # Add minimal info overlay (only essential text)
-        if self.frame_count % 2 == 0:  # Update text every 2nd frame
-            # Basic info
-            cv2.putText(result_frame, f"Det: {len(detections)} | FPS: {self.fps:.1f}", 
-                       (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-            
-            # Conveyor info (only if enabled)
-            if self.production_line_mode and self.conveyor_speed > 0:
-                cv2.putText(result_frame, f"Speed: {self.conveyor_speed:.1f} m/s", 
-                           (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
+        # Basic info
+        cv2.putText(result_frame, f"Det: {len(detections)} | FPS: {self.fps:.1f}", 
+                   (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+        
+        # Conveyor info (only if enabled)
+        if self.production_line_mode and self.conveyor_speed > 0:
+            cv2.putText(result_frame, f"Speed: {self.conveyor_speed:.1f} m/s", 
+                       (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
         
+        self.last_result_frame = result_frame
         return result_frame, detections
     
+    def display_due(self):
+        """
+        True when the preview window should be refreshed
+        
+        PERFORMANCE OPTIMIZATION: The preview is capped at display_fps on
+        elapsed time, independent of the frame skip interval. The monotonic
+        clock keeps NTP or manual clock changes from stalling the preview.
+        """
+        now = time.monotonic()
+        if now - self._last_display_time < 1.0 / self.display_fps:
+            return False
+        self._last_display_time = now
+        return True
+    
+    def _copy_for_drawing(self, frame, out=None):
+        """
+        Copy frame into out, or the reusable display buffer
+        
+        PERFORMANCE OPTIMIZATION: One buffer for the life of the detector
+        instead of a new frame.copy() per displayed frame. The result is
+        overwritten by the next call; callers that keep results across
+        calls (the detection pipeline) pass their own out.
+        """
+        if out is None:
+            if self._draw_buf is None or self._draw_buf.shape != frame.shape:
+                self._draw_buf = np.empty_like(frame)
+            out = self._draw_buf
+        np.copyto(out, frame)
+        return out
+    
     def calculate_detection_coverage(self, detections, frame_width, frame_height):
         """
         Calculate detection coverage percentage across the frame
         """
-        if not detections:
+        if len(detections) == 0:
             return 0.0
         
         # Calculate total area covered by detections
-        total_coverage = 0
-        for detection in detections:
-            x1, y1, x2, y2, confidence, class_id = detection
-            area = (x2 - x1) * (y2 - y1)
-            total_coverage += area
+        widths = detections[:, 2] - detections[:, 0]
+        heights = detections[:, 3] - detections[:, 1]
+        total_coverage = float(np.dot(widths, heights))
         
         # Calculate percentage of frame covered
         frame_area = frame_width * frame_height
@@ -561,60 +1047,121 @@ class RaspberryMilkDetector:
         
         return min(100.0, coverage_percent)
     
-    def start_camera_detection(self, camera_index=0, resolution=(640, 480), target_fps=15):
-        """
-        Start real-time camera detection
-        
-        Args:
-            camera_index: Camera device index (usually 0 for Pi Camera)
-            resolution: Camera resolution (width, height)
-            target_fps: Target FPS for performance optimization
+    def _run_detection_pipeline(self, grabber, window_name):
         """
-        print(f"Starting camera detection with resolution {resolution}")
-        print("Press 'q' to quit, 's' to save current frame, '1/2/3' to set frame skip")
-        print("Press 'c' to toggle conveyor mode, 'v' to set conveyor speed, 'l' for low-latency mode")
-        
-        # PERFORMANCE OPTIMIZATION: Auto-optimize for target FPS
-        self.optimize_for_performance(target_fps)
+        Detect on captured frames and show the results until 'q', Ctrl+C or
+        a capture failure
         
-        # Initialize camera
-        cap = cv2.VideoCapture(camera_index)
+        PERFORMANCE OPTIMIZATION: Capture (grabber), detection (a worker
+        thread) and display plus key handling (this thread) run concurrently,
+        each handing its newest output to the next stage through a 1-slot
+        queue. Inference never waits on imshow/waitKey or a key handler, and
+        stale frames are dropped instead of piling up.
         
-        if not cap.isOpened():
-            print(f"Error: Could not open camera {camera_index}")
-            return
-        
-        # Set camera properties
-        cap.set(cv2.CAP_PROP_FRAME_WIDTH, resolution[0])
-        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, resolution[1])
-        cap.set(cv2.CAP_PROP_FPS, target_fps)
-        
-        # PERFORMANCE OPTIMIZATION: Reduce buffer size
-        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        Result frames are DRAW_BUFFERS preallocated buffers handed back and
+        forth through a free list: detection only draws into a buffer taken
+        from it, and a buffer returns to it once the display has moved on to
+        a newer result or the result was dropped unseen. A buffer being shown
+        or saved is therefore never drawn over.
         
+        Args:
+            grabber: Started FrameGrabber returning (frame, model_rgb) pairs;
+                stopped before this returns
+            window_name: Title of the preview window
+        """
         # Create output directory for saved frames
         output_dir = Path("saved_frames")
         output_dir.mkdir(exist_ok=True)
         
+        # Buffers detection may draw into (None until first sized)
+        free_buffers = queue.Queue()
+        for _ in range(DRAW_BUFFERS):
+            free_buffers.put(None)
+        
+        def detect_next():
+            while True:
+                captured = grabber.read()
+                if captured is None:
+                    return None
+                frame = captured[0]
+                
+                # Wait for a buffer nothing else is reading
+                buf = None
+                while buf is None:
+                    if not self.running:
+                        return None
+                    try:
+                        buf = free_buffers.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
+                    if buf is None or buf.shape != frame.shape:
+                        buf = np.empty_like(frame)
+                
+                # Process frame
+                result_frame, detections = self.process_frame(*captured, out=buf)
+                
+                # Calculate FPS
+                self.calculate_fps()
+                
+                # Speed typed at the 'v' prompt, if any
+                self.apply_entered_conveyor_speed()
+                
+                # Print detection info every 30 frames
+                if self.frame_count % 30 == 0:
+                    status = f"FPS: {self.fps:.1f}, Detections: {len(detections)}, Frame Skip: {self.frame_skip_interval}"
+                    if self.production_line_mode:
+                        status += f", Conveyor: {self.conveyor_speed:.2f} m/s"
+                    print(status)
+                
+                if result_frame is buf:
+                    return result_frame, detections
+                # Skipped frame: the cached result is already with the
+                # display, nothing new to hand over
+                free_buffers.put(buf)
+        
+        # PERFORMANCE OPTIMIZATION: Let the preview be drawn through OpenGL
+        # when OpenCV's GUI backend supports it, instead of a CPU-side blit
+        if self.display_enabled:
+            try:
+                cv2.namedWindow(window_name, cv2.WINDOW_OPENGL | cv2.WINDOW_AUTOSIZE)
+            except cv2.error:
+                cv2.namedWindow(window_name, cv2.WINDOW_AUTOSIZE)
+        else:
+            print("Display disabled: press Ctrl+C to stop")
+        
         self.running = True
+        # Detection runs on the inference cores; results dropped unseen give
+        # their buffer straight back
+        worker = FrameGrabber(detect_next, self.inference_cpus, name="detection",
+                              discard=lambda result: free_buffers.put(result[0])).start()
+        # Snapshots ('s') are encoded and written off the detection loop
+        writer = FrameWriter().start()
+        result_frame = None
         
         try:
             while self.running:
-                # Capture frame
-                ret, frame = cap.read()
-                if not ret:
+                # Newest detection result; waiting briefly keeps the window
+                # and keys responsive while a frame is being processed
+                try:
+                    processed = worker.read(timeout=0.05)
+                except queue.Empty:
+                    processed = ()
+                if processed is None:
                     print("Error: Could not read frame")
                     break
+                if processed:
+                    # The previous result is no longer shown or saved from
+                    if result_frame is not None:
+                        free_buffers.put(result_frame)
+                    result_frame, detections = processed
+                    
+                    # PERFORMANCE OPTIMIZATION: Reduce display frequency
+                    if self.display_enabled and self.display_due():
+                        cv2.imshow(window_name, result_frame)
                 
-                # Process frame
-                result_frame, detections = self.process_frame(frame)
-                
-                # Calculate FPS
-                self.calculate_fps()
-                
-                # PERFORMANCE OPTIMIZATION: Reduce display frequency
-                if self.frame_count % 2 == 0:  # Update display every 2nd frame
-                    cv2.imshow('Milk Detection - Raspberry Pi', result_frame)
+                # Without a window there are no keys to poll; Ctrl+C stops
+                if not self.display_enabled:
+                    continue
                 
                 # Handle key presses
                 key = cv2.waitKey(1) & 0xFF
@@ -622,10 +1169,10 @@ class RaspberryMilkDetector:
                     break
                 elif key == ord('s'):
                     # Save current frame
-                    timestamp = time.strftime("%Y%m%d_%H%M%S")
-                    filename = output_dir / f"milk_detection_{timestamp}.jpg"
-                    cv2.imwrite(str(filename), result_frame)
-                    print(f"Frame saved: {filename}")
+                    if result_frame is not None:
+                        timestamp = time.strftime("%Y%m%d_%H%M%S")
+                        filename = output_dir / f"milk_detection_{timestamp}.jpg"
+                        writer.save(filename, result_frame)
                 elif key == ord('1'):
                     self.set_frame_skip(1)
                 elif key == ord('2'):
@@ -642,13 +1189,9 @@ class RaspberryMilkDetector:
                         self.speed_detection_enabled = False
                         print("Conveyor mode disabled")
                 elif key == ord('v'):
-                    # Set conveyor speed manually
-                    try:
-                        speed_input = input("Enter conveyor speed (m/s): ")
-                        speed = float(speed_input)
-                        self.set_conveyor_speed(speed)
-                    except (ValueError, EOFError):
-                        print("Invalid speed value")
+                    # Set conveyor speed manually (typed in the terminal
+                    # while detection keeps running)
+                    self.prompt_conveyor_speed()
                 elif key == ord('l'):
                     # Toggle low-latency mode
                     if hasattr(self, 'low_latency_enabled') and self.low_latency_enabled:
@@ -662,19 +1205,61 @@ class RaspberryMilkDetector:
                         self.enable_low_latency_mode()
                         self.low_latency_enabled = True
                 
-                # Print detection info every 30 frames
-                if self.frame_count % 30 == 0:
-                    status = f"FPS: {self.fps:.1f}, Detections: {len(detections)}, Frame Skip: {self.frame_skip_interval}"
-                    if self.production_line_mode:
-                        status += f", Conveyor: {self.conveyor_speed:.2f} m/s"
-                    print(status)
-                
         except KeyboardInterrupt:
             print("\nInterrupted by user")
         finally:
             self.running = False
+            worker.stop()
+            grabber.stop()
+            writer.stop()
+            if self.display_enabled:
+                cv2.destroyAllWindows()
+    
+    def start_camera_detection(self, camera_index=0, resolution=(640, 480), target_fps=15):
+        """
+        Start real-time camera detection
+        
+        Args:
+            camera_index: Camera device index (usually 0 for Pi Camera)
+            resolution: Camera resolution (width, height)
+            target_fps: Target FPS for performance optimization
+        """
+        print(f"Starting camera detection with resolution {resolution}")
+        print("Press 'q' to quit, 's' to save current frame, '1/2/3' to set frame skip")
+        print("Press 'c' to toggle conveyor mode, 'v' to set conveyor speed, 'l' for low-latency mode")
+        
+        # PERFORMANCE OPTIMIZATION: Auto-optimize for target FPS
+        self.optimize_for_performance(target_fps)
+        
+        # Initialize camera
+        cap = cv2.VideoCapture(camera_index)
+        
+        if not cap.isOpened():
+            print(f"Error: Could not open camera {camera_index}")
+            return
+        
+        # Set camera properties
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, resolution[0])
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, resolution[1])
+        cap.set(cv2.CAP_PROP_FPS, target_fps)
+        
+        # PERFORMANCE OPTIMIZATION: Reduce buffer size. V4L2 queues 4 frames
+        # by default, so each read would return a frame ~3 frames old
+        # (~100 ms at 30 FPS); with 1 the newest frame is returned. Not all
+        # backends support it, so report when the setting is ignored.
+        if not cap.set(cv2.CAP_PROP_BUFFERSIZE, 1):
+            print("Note: camera backend ignores the buffer size, frames may lag")
+        
+        # Capture on a background thread, overlapping with detection
+        def read_frame():
+            ret, frame = cap.read()
+            return (frame, None) if ret else None
+        grabber = FrameGrabber(read_frame, self.capture_cpus).start()
+        
+        try:
+            self._run_detection_pipeline(grabber, 'Milk Detection - Raspberry Pi')
+        finally:
             cap.release()
-            cv2.destroyAllWindows()
             print("Camera detection stopped")
     
     def start_picamera2_detection(self, resolution=(640, 480), target_fps=15):
@@ -704,9 +1289,19 @@ class RaspberryMilkDetector:
         # Initialize PiCamera2
         picam2 = Picamera2()
         
+        # PERFORMANCE OPTIMIZATION: Have the ISP scale a second "lores" YUV420
+        # stream to the model input size, so inference needs no software
+        # resize. lores cannot be larger than main and needs even dimensions.
+        model_size = (self.input_width, self.input_height)
+        use_lores = (model_size[0] <= resolution[0] and model_size[1] <= resolution[1]
+                     and model_size[0] % 2 == 0 and model_size[1] % 2 == 0)
+        if use_lores:
+            print(f"Using {model_size[0]}x{model_size[1]} lores stream for model input")
+        
         # Configure camera with minimal, widely-supported settings
         config = picam2.create_preview_configuration(
             main={"size": resolution, "format": "RGB888"},
+            lores={"size": model_size, "format": "YUV420"} if use_lores else None,
             buffer_count=2  # Reduced buffer for lower latency
             # Remove custom controls to avoid compatibility issues
         )
@@ -718,89 +1313,28 @@ class RaspberryMilkDetector:
         # Wait for camera to stabilize and apply settings
         time.sleep(2)
         
-        # Create output directory for saved frames
-        output_dir = Path("saved_frames")
-        output_dir.mkdir(exist_ok=True)
-        
-        self.running = True
+        # Capture on a background thread, overlapping with detection.
+        # libcamera's "RGB888" is already B, G, R in memory - what OpenCV
+        # expects - so the main frame needs no conversion.
+        def read_frames():
+            if not use_lores:
+                return picam2.capture_array(), None
+            # Both streams from the same request, so they show the same instant
+            request = picam2.capture_request()
+            try:
+                frame = request.make_array("main")
+                yuv = request.make_array("lores")
+            finally:
+                request.release()
+            # Crop any row padding libcamera added to the lores stride
+            model_rgb = cv2.cvtColor(yuv, cv2.COLOR_YUV2RGB_I420)[:, :model_size[0]]
+            return frame, model_rgb
+        grabber = FrameGrabber(read_frames, self.capture_cpus).start()
         
         try:
-            while self.running:
-                # Capture frame
-                frame = picam2.capture_array()
-                
-                # Convert from RGB to BGR for OpenCV
-                frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-                
-                # Process frame
-                result_frame, detections = self.process_frame(frame)
-                
-                # Calculate FPS
-                self.calculate_fps()
-                
-                # PERFORMANCE OPTIMIZATION: Reduce display frequency
-                if self.frame_count % 2 == 0:  # Update display every 2nd frame
-                    cv2.imshow('Milk Detection - PiCamera2', result_frame)
-                
-                # Handle key presses
-                key = cv2.waitKey(1) & 0xFF
-                if key == ord('q'):
-                    break
-                elif key == ord('s'):
-                    # Save current frame
-                    timestamp = time.strftime("%Y%m%d_%H%M%S")
-                    filename = output_dir / f"milk_detection_{timestamp}.jpg"
-                    cv2.imwrite(str(filename), result_frame)
-                    print(f"Frame saved: {filename}")
-                elif key == ord('1'):
-                    self.set_frame_skip(1)
-                elif key == ord('2'):
-                    self.set_frame_skip(2)
-                elif key == ord('3'):
-                    self.set_frame_skip(3)
-                elif key == ord('c'):
-                    # Toggle conveyor mode
-                    if not self.production_line_mode:
-                        self.enable_production_line_mode()
-                        print("Conveyor mode enabled")
-                    else:
-                        self.production_line_mode = False
-                        self.speed_detection_enabled = False
-                        print("Conveyor mode disabled")
-                elif key == ord('v'):
-                    # Set conveyor speed manually
-                    try:
-                        speed_input = input("Enter conveyor speed (m/s): ")
-                        speed = float(speed_input)
-                        self.set_conveyor_speed(speed)
-                    except (ValueError, EOFError):
-                        print("Invalid speed value")
-                elif key == ord('l'):
-                    # Toggle low-latency mode
-                    if hasattr(self, 'low_latency_enabled') and self.low_latency_enabled:
-                        # Disable low-latency mode
-                        self.low_latency_enabled = False
-                        self.frame_skip_interval = 2
-                        self.target_fps = 15
-                        print("Low-latency mode disabled")
-                    else:
-                        # Enable low-latency mode
-                        self.enable_low_latency_mode()
-                        self.low_latency_enabled = True
-                
-                # Print detection info every 30 frames
-                if self.frame_count % 30 == 0:
-                    status = f"FPS: {self.fps:.1f}, Detections: {len(detections)}, Frame Skip: {self.frame_skip_interval}"
-                    if self.production_line_mode:
-                        status += f", Conveyor: {self.conveyor_speed:.2f} m/s"
-                    print(status)
-                
-        except KeyboardInterrupt:
-            print("\nInterrupted by user")
+            self._run_detection_pipeline(grabber, 'Milk Detection - PiCamera2')
         finally:
-            self.running = False
             picam2.close()
-            cv2.destroyAllWindows()
             print("PiCamera2 detection stopped")
 
 def signal_handler(sig, frame):
@@ -808,10 +1342,22 @@ def signal_handler(sig, frame):
     print("\nShutting down gracefully...")
     sys.exit(0)
 
-def main():
+# Settings parsed from the command line, fixed for the whole run
+RuntimeConfig = namedtuple('RuntimeConfig', 'model confidence nms threads resolution camera use_picamera2 '
+                                            'target_fps performance_mode conveyor_mode conveyor_speed '
+                                            'conveyor_width low_latency display')
+
+def parse_runtime_config(argv=None):
+    """
+    Parse and validate the command line into a RuntimeConfig
+    
+    Returns None, after printing the reason, when the settings are unusable.
+    """
     parser = argparse.ArgumentParser(description="Raspberry Pi Milk Packet Detector")
-    parser.add_argument("--model", default="model/best_float32.tflite", 
-                       help="Path to TFLite model")
+    parser.add_argument("--model", default=None, 
+                       help=f"Path to TFLite model (default: fastest available, else {FLOAT_MODEL})")
+    parser.add_argument("--quantized", action="store_true",
+                       help="Prefer an int8 model (model/best_int8.tflite) when no Edge TPU model applies")
     parser.add_argument("--confidence", type=float, default=0.5,
                        help="Confidence threshold (default: 0.5)")
     parser.add_argument("--nms", type=float, default=0.4,
@@ -833,78 +1379,106 @@ def main():
     parser.add_argument("--conveyor-width", type=float, default=0.5,
                        help="Conveyor belt width in meters (default: 0.5)")
     parser.add_argument("--low-latency", action="store_true",
-                       help="Enable low-latency mode for production line (minimal delay)")
+                       help="Enable low-latency mode for production line (minimal delay, no preview window unless --display)")
+    parser.add_argument("--no-display", action="store_true",
+                       help="Run without the preview window (stop with Ctrl+C)")
+    parser.add_argument("--display", action="store_true",
+                       help="Keep the preview window in low-latency mode")
+    parser.add_argument("--threads", type=int, default=None,
+                       help="TFLite inference threads (default: one per core not used for capture)")
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
     # Parse resolution
     try:
         width, height = map(int, args.resolution.split('x'))
-        resolution = (width, height)
     except ValueError:
         print("Error: Invalid resolution format. Use WIDTHxHEIGHT (e.g., 640x480)")
-        return
+        return None
+    
+    # PERFORMANCE OPTIMIZATION: Without an explicit --model, use the
+    # fastest model present (Edge TPU, then int8 with --quantized, then float32)
+    model = args.model if args.model is not None else resolve_model_path(args.quantized)
     
     # Check if model exists
-    if not os.path.exists(args.model):
-        print(f"Error: Model file not found: {args.model}")
+    if not os.path.exists(model):
+        print(f"Error: Model file not found: {model}")
+        return None
+    
+    return RuntimeConfig(
+        model=model,
+        confidence=args.confidence,
+        nms=args.nms,
+        threads=args.threads,
+        resolution=(width, height),
+        camera=args.camera,
+        use_picamera2=args.use_picamera2,
+        target_fps=args.target_fps,
+        performance_mode=args.performance_mode,
+        conveyor_mode=args.conveyor_mode,
+        conveyor_speed=args.conveyor_speed,
+        conveyor_width=args.conveyor_width,
+        low_latency=args.low_latency,
+        # PERFORMANCE OPTIMIZATION: Skip the preview window when not needed;
+        # a production line rarely watches it, so low-latency mode drops it too
+        display=not (args.no_display or (args.low_latency and not args.display)),
+    )
+
+def main():
+    cfg = parse_runtime_config()
+    if cfg is None:
         return
     
     # Set up signal handler
     signal.signal(signal.SIGINT, signal_handler)
     
     # Initialize detector
-    detector = RaspberryMilkDetector(args.model, args.confidence, args.nms)
+    detector = RaspberryMilkDetector(cfg.model, cfg.confidence, cfg.nms, cfg.threads)
     
     # PERFORMANCE OPTIMIZATION: Apply performance mode settings
-    if args.performance_mode == "speed":
-        detector.optimize_for_performance(10)
-        print("Performance mode: SPEED (target: 10+ FPS)")
-    elif args.performance_mode == "quality":
-        detector.optimize_for_performance(30)
-        print("Performance mode: QUALITY (target: 30 FPS)")
-    else:  # balanced
-        detector.optimize_for_performance(args.target_fps)
-        print("Performance mode: BALANCED")
+    detector.apply_performance_mode(cfg.performance_mode, cfg.target_fps)
     
     # CONVEYOR BELT SYNCHRONIZATION: Enable if requested
-    if args.conveyor_mode:
-        detector.enable_production_line_mode(args.conveyor_width)
-        print(f"Conveyor mode enabled with width: {args.conveyor_width}m")
+    if cfg.conveyor_mode:
+        detector.enable_production_line_mode(cfg.conveyor_width)
+        print(f"Conveyor mode enabled with width: {cfg.conveyor_width}m")
         
-        if args.conveyor_speed > 0:
-            detector.set_conveyor_speed(args.conveyor_speed)
-            print(f"Conveyor speed set to: {args.conveyor_speed} m/s")
+        if cfg.conveyor_speed > 0:
+            detector.set_conveyor_speed(cfg.conveyor_speed)
+            print(f"Conveyor speed set to: {cfg.conveyor_speed} m/s")
         else:
             print("Conveyor speed: Auto-detection enabled")
     
     # LOW-LATENCY MODE: Enable if requested
-    if args.low_latency:
+    if cfg.low_latency:
         detector.enable_low_latency_mode()
         print("Low-latency mode enabled for production line")
     
+    detector.display_enabled = cfg.display
+    
     print("Raspberry Pi Milk Detector Started!")
-    print(f"Model: {args.model}")
-    print(f"Resolution: {resolution}")
-    print(f"Target FPS: {args.target_fps}")
-    print(f"Confidence threshold: {args.confidence}")
-    print(f"NMS threshold: {args.nms}")
+    print(f"Model: {cfg.model}")
+    print(f"Resolution: {cfg.resolution}")
+    print(f"Target FPS: {cfg.target_fps}")
+    print(f"Confidence threshold: {cfg.confidence}")
+    print(f"NMS threshold: {cfg.nms}")
     print(f"Frame skip interval: {detector.frame_skip_interval}")
+    print(f"Display: {'ON' if detector.display_enabled else 'OFF'}")
     
-    if args.conveyor_mode:
+    if cfg.conveyor_mode:
         print(f"Conveyor mode: ENABLED")
-        print(f"Conveyor width: {args.conveyor_width}m")
-        print(f"Speed detection: {'Manual' if args.conveyor_speed > 0 else 'Auto'}")
+        print(f"Conveyor width: {cfg.conveyor_width}m")
+        print(f"Speed detection: {'Manual' if cfg.conveyor_speed > 0 else 'Auto'}")
     
     try:
-        if args.use_picamera2:
-            detector.start_picamera2_detection(resolution, args.target_fps)
+        if cfg.use_picamera2:
+            detector.start_picamera2_detection(cfg.resolution, cfg.target_fps)
         else:
-            detector.start_camera_detection(args.camera, resolution, args.target_fps)
+            detector.start_camera_detection(cfg.camera, cfg.resolution, cfg.target_fps)
     except Exception as e:
         print(f"Error during detection: {e}")
         print("Falling back to OpenCV camera...")
-        detector.start_camera_detection(args.camera, resolution, args.target_fps)
+        detector.start_camera_detection(cfg.camera, cfg.resolution, cfg.target_fps)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
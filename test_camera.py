@@ -8,6 +8,16 @@ import cv2
 import time
 import argparse
 import sys
+from functools import lru_cache
+
+@lru_cache(maxsize=1)
+def _load_picamera2():
+    """Import Picamera2 once; None if unavailable (failed imports aren't cached by Python)"""
+    try:
+        from picamera2 import Picamera2
+        return Picamera2
+    except ImportError:
+        return None
 
 def test_opencv_camera(camera_index=0, resolution=(640, 480)):
     """Test OpenCV camera interface"""
@@ -76,14 +86,12 @@ def test_opencv_camera(camera_index=0, resolution=(640, 480)):
         cap.release()
         cv2.destroyAllWindows()
 
-def test_picamera2(resolution=(640, 480)):
+def test_picamera2(resolution=(640, 480), settle_time=2.0):
     """Test PiCamera2 interface"""
     print("Testing PiCamera2...")
     
-    try:
-        from picamera2 import Picamera2
-        from picamera2.encoders import JpegEncoder
-    except ImportError:
+    Picamera2 = _load_picamera2()
+    if Picamera2 is None:
         print("PiCamera2 not available")
         return False
     
@@ -103,7 +111,8 @@ def test_picamera2(resolution=(640, 480)):
         picam2.start()
         
         # Wait for camera to stabilize and apply settings
-        time.sleep(2)
+        if settle_time > 0:
+            time.sleep(settle_time)
         
         print(f"PiCamera2 initialized with {resolution[0]}x{resolution[1]}")
         
@@ -116,9 +125,6 @@ def test_picamera2(resolution=(640, 480)):
                 # Capture frame
                 frame = picam2.capture_array()
                 
-                # Convert from RGB to BGR for OpenCV
-                frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-                
                 # Display frame
                 cv2.imshow('PiCamera2 Test', frame)
                 
@@ -186,10 +192,9 @@ def test_camera_list():
         print("  No video devices found")
     
     # Check for PiCamera2
-    try:
-        from picamera2 import Picamera2
+    if _load_picamera2() is not None:
         print("  PiCamera2: Available")
-    except ImportError:
+    else:
         print("  PiCamera2: Not available")
 
 def main():
@@ -199,6 +204,8 @@ def main():
     parser.add_argument("--list", action="store_true", help="List available cameras")
     parser.add_argument("--camera", type=int, default=0, help="Camera device index")
     parser.add_argument("--resolution", default="640x480", help="Test resolution")
+    parser.add_argument("--settle", type=float, default=2.0,
+                       help="Seconds to let PiCamera2 auto-exposure settle (0 to skip)")
     
     args = parser.parse_args()
     
@@ -220,7 +227,7 @@ def main():
         return
     
     if args.picamera2:
-        test_picamera2(resolution)
+        test_picamera2(resolution, args.settle)
         return
     
     if args.opencv:
@@ -232,7 +239,7 @@ def main():
     print("")
     
     # Test PiCamera2 first (recommended for Pi)
-    if test_picamera2(resolution):
+    if test_picamera2(resolution, args.settle):
         print("\nPiCamera2 test completed successfully!")
     else:
         print("\nPiCamera2 test failed or not available")
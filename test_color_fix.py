@@ -49,9 +49,6 @@ def test_picamera2_color():
             # Capture frame
             frame = picam2.capture_array()
             
-            # Convert from RGB to BGR for OpenCV
-            frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-            
             # Add frame counter
             cv2.putText(frame, f"Frame: {frame_count}", (10, 30), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)